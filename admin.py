@@ -0,0 +1,107 @@
+import os
+import streamlit as st
+import pandas as pd
+from metrics import metrics, METRICS_FILE
+from scheduler import get_scheduler
+
+# The admin page stays locked unless a password is configured
+ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD")
+
+def _rows(series, name):
+    """(labels dict, value) pairs of one metric from a snapshot"""
+    return [(dict(labels), value) for (series_name, labels), value in series.items() if series_name == name]
+
+def admin_page():
+    st.subheader("🛠 Admin: API and cache metrics")
+
+    if not ADMIN_PASSWORD:
+        st.info("Set ADMIN_PASSWORD to enable the admin page.")
+        return
+    if not st.session_state.get('admin_ok'):
+        password = st.text_input("Admin password:", type="password")
+        if password != ADMIN_PASSWORD:
+            if password:
+                st.error("Incorrect password")
+            return
+        st.session_state['admin_ok'] = True
+
+    counters, timings = metrics.snapshot()
+
+    # Calls in the last minute against the per-minute quotas
+    per_minute = metrics.calls_last_minute()
+    cols = st.columns(4)
+    cols[0].metric("Reads (last minute)", per_minute['read'])
+    cols[1].metric("Writes (last minute)", per_minute['write'])
+    retries = sum(value for _, value in _rows(counters, "registration_flush_retries_total"))
+    cols[2].metric("Registration flush retries", retries)
+    duplicates = sum(value for _, value in _rows(counters, "registration_duplicates_total"))
+    cols[3].metric("Duplicate registrations refused", duplicates)
+
+    # Worksheet calls by method
+    calls = {}
+    def call_row(method):
+        return calls.setdefault(method, {'Method': method, 'Kind': '', 'Calls': 0, 'Errors': 0, 'Quota errors': 0})
+    for labels, value in _rows(counters, "sheets_calls_total"):
+        row = call_row(labels['method'])
+        row['Kind'] = labels['kind']
+        row['Calls'] = value
+    for labels, value in _rows(counters, "sheets_errors_total"):
+        row = call_row(labels['method'])
+        row['Errors'] += value
+        if labels['error'] == 'quota':
+            row['Quota errors'] += value
+    for labels, (count, total, peak) in _rows(timings, "sheets_call_seconds"):
+        if labels['method'] in calls:
+            calls[labels['method']]['Avg ms'] = round(total / count * 1000, 1)
+            calls[labels['method']]['Max ms'] = round(peak * 1000, 1)
+    st.write("**Worksheet calls**")
+    if calls:
+        st.dataframe(pd.DataFrame(list(calls.values())), hide_index=True, use_container_width=True)
+    else:
+        st.caption("No worksheet calls yet")
+
+    # Calls waiting for quota now, and how long calls have waited by priority
+    st.write("**Quota queue**")
+    queued = get_scheduler().queued()
+    st.caption(" | ".join(
+        f"{kind.title()}s waiting: " + (", ".join(f"{count} {name}" for name, count in levels.items()) or "none")
+        for kind, levels in queued.items()
+    ))
+    waits = [
+        {'Kind': labels['kind'], 'Priority': labels['priority'], 'Calls': count,
+         'Avg wait ms': round(total / count * 1000, 1), 'Max wait ms': round(peak * 1000, 1)}
+        for labels, (count, total, peak) in _rows(timings, "sheets_queue_wait_seconds")
+    ]
+    if waits:
+        st.dataframe(pd.DataFrame(waits), hide_index=True, use_container_width=True)
+
+    # Cache lookups by cache and result
+    caches = {}
+    for labels, value in _rows(counters, "cache_requests_total"):
+        caches.setdefault(labels['cache'], {'Cache': labels['cache']})[labels['result'].title()] = value
+    st.write("**Caches**")
+    if caches:
+        cache_df = pd.DataFrame(list(caches.values())).fillna(0)
+        results = cache_df.columns.drop('Cache')
+        cache_df[results] = cache_df[results].astype(int)
+        lookups = cache_df[results].sum(axis=1)
+        cache_df['Hit rate'] = (cache_df.get('Hit', 0) / lookups).map('{:.0%}'.format)
+        st.dataframe(cache_df, hide_index=True, use_container_width=True)
+    else:
+        st.caption("No cache lookups yet")
+
+    # Dashboard render timings per section
+    sections = [
+        {'Section': labels['section'], 'Renders': count,
+         'Avg ms': round(total / count * 1000, 1), 'Max ms': round(peak * 1000, 1)}
+        for labels, (count, total, peak) in _rows(timings, "dashboard_section_seconds")
+    ]
+    st.write("**Dashboard sections**")
+    if sections:
+        st.dataframe(pd.DataFrame(sections), hide_index=True, use_container_width=True)
+    else:
+        st.caption("No dashboard renders yet")
+
+    st.caption(f"Prometheus metrics are written to {METRICS_FILE}")
+    st.download_button("Download metrics", metrics.render_prometheus(),
+                       file_name="metrics.prom", mime="text/plain")
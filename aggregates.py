@@ -0,0 +1,97 @@
+DIMENSIONS = ['Gender', 'Region', 'Division', 'Designation Level']
+
+# Status of a duplicate row merged into another participant; not counted
+MERGED = 'Merged'
+
+def _counts(series):
+    return {value: int(count) for value, count in series.value_counts().items() if count and value != ''}
+
+def _add_counts(counts, series):
+    for value, count in _counts(series).items():
+        counts[value] = counts.get(value, 0) + count
+
+class Aggregates:
+    """Participant counts computed once per data version
+
+    Holds totals by status and, for each dimension, counts of all and of
+    confirmed participants. Rows merged away as duplicates are left out.
+    Confirmations update the counts in place through apply_changes and new
+    registrations through apply_append, instead of recounting the frame.
+    """
+
+    def __init__(self, df):
+        self.total = 0
+        self.confirmed = 0
+        self.by_status = {}
+        self.totals = {dim: {} for dim in DIMENSIONS}
+        self.confirmed_by = {dim: {} for dim in DIMENSIONS}
+        self.apply_append(df, df)
+
+    def apply_append(self, df, rows):
+        """Count appended ``rows`` in"""
+        confirmed = rows['Registration Status'] == 'Confirmed'
+        counted = rows['Registration Status'] != MERGED
+        self.total += int(counted.sum())
+        self.confirmed += int(confirmed.sum())
+        _add_counts(self.by_status, rows['Registration Status'])
+        for dim in DIMENSIONS:
+            _add_counts(self.totals[dim], rows.loc[counted, dim])
+            _add_counts(self.confirmed_by[dim], rows.loc[confirmed, dim])
+        return True
+
+    @property
+    def unconfirmed(self):
+        return self.total - self.confirmed
+
+    def count(self, dim, value, confirmed=None):
+        """Participants with ``dim == value``; confirmed=True/False narrows by status"""
+        total = self.totals[dim].get(value, 0)
+        done = self.confirmed_by[dim].get(value, 0)
+        if confirmed is None:
+            return total
+        return done if confirmed else total - done
+
+    def values(self, dim, unconfirmed=False):
+        """Sorted values of a dimension, optionally only those with unconfirmed participants"""
+        if unconfirmed:
+            return sorted(v for v in self.totals[dim] if self.count(dim, v, confirmed=False))
+        return sorted(self.totals[dim])
+
+    def apply_changes(self, df, changes, before):
+        """Update counts for status changes already applied to ``df``
+
+        Returns False when a change touches a counted dimension, in which case
+        the caller should rebuild instead.
+        """
+        if any(dim in cols for cols in changes.values() for dim in DIMENSIONS):
+            return False
+
+        moved = {}
+        for idx, cols in changes.items():
+            if 'Registration Status' in cols and before[idx]['Registration Status'] != cols['Registration Status']:
+                moved[idx] = (before[idx]['Registration Status'], cols['Registration Status'])
+        if not moved:
+            return True
+
+        confirmed_steps, total_steps = [], []
+        for old, new in moved.values():
+            if old:
+                self.by_status[old] = self.by_status.get(old, 0) - 1
+            if new:
+                self.by_status[new] = self.by_status.get(new, 0) + 1
+            confirmed_steps.append((new == 'Confirmed') - (old == 'Confirmed'))
+            total_steps.append((old == MERGED) - (new == MERGED))
+        self.confirmed += sum(confirmed_steps)
+        self.total += sum(total_steps)
+
+        # Dimension values of every moved row in one read
+        values = df.loc[list(moved), DIMENSIONS]
+        for dim in DIMENSIONS:
+            for value, confirmed_step, total_step in zip(values[dim].tolist(), confirmed_steps, total_steps):
+                if value == '':
+                    continue
+                if confirmed_step:
+                    self.confirmed_by[dim][value] = self.confirmed_by[dim].get(value, 0) + confirmed_step
+                if total_step:
+                    self.totals[dim][value] = self.totals[dim].get(value, 0) + total_step
+        return True
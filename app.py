@@ -1,10 +1,12 @@
 import streamlit as st
-from workersdata import workers
-from dash import RegistrationDashboard
+from metrics import start_exporter
 
 # Set page configuration
 st.set_page_config(page_title="workersdclmghApp", page_icon="🟢", layout="centered")
 
+# Periodically write the Prometheus metrics file (one thread per process)
+start_exporter()
+
 
 
 # Sidebar content (Image + Menu inside bordered container)
@@ -12,17 +14,26 @@ with st.sidebar:
     st.subheader("DCLM National Workers Conference", divider="blue")
     st.image('./display/workers.jpg')
     with st.container(border=True):
-        sections = st.radio("**MENU**", ["Dashboard", "Registration"], key="sections")
+        sections = st.radio("**MENU**", ["Dashboard", "Registration", "Import", "Admin"], key="sections")
     st.subheader("National Administration", divider="blue")
     st.divider()
 
 st.divider()
 with st.container(border=True):
-    # Main function based on section selection
+    # Main function based on section selection. Each section is imported only
+    # when selected, so a registration-only kiosk never loads pandas or rapidfuzz.
     if sections == "Dashboard":
+        from dash import RegistrationDashboard
         RegistrationDashboard().run()
     elif sections == "Registration":
+        from workersdata import workers
         workers()
+    elif sections == "Import":
+        from bulkimport import import_page
+        import_page()
+    elif sections == "Admin":
+        from admin import admin_page
+        admin_page()
 
 # Hide default Streamlit UI elements
 st.markdown(
@@ -0,0 +1,259 @@
+"""Benchmarks for the dashboard and registration hot paths
+
+Generates synthetic registrations from ``config.reg_div`` (messy headers,
+duplicate names, formatted phone numbers), loads them into an in-memory
+SQLite worksheet and times each hot path, reporting the best of ``--repeat``
+runs and the peak memory of one traced run.
+
+    python bench.py                      # 1k, 10k and 100k rows
+    python bench.py --sizes 1000 --repeat 5
+    python bench.py --output bench_output.txt
+"""
+import argparse
+import atexit
+import os
+import shutil
+import random
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from config import reg_div, genders, designation_levels
+from storage import SQLiteStorage
+from loader import IncrementalLoader
+from search import ContactIndex, NameIndex
+from aggregates import Aggregates
+from cleaning import clean_rows, concat_frames
+from duplicates import DuplicateFinder
+from timeseries import RegistrationSeries
+from rowids import RowIndex, new_registration_id
+from journal import RegistrationJournal, RegistrationQueue
+from writeback import write_rows
+from snapshot import load_snapshot, save_snapshot
+
+SIZES = [1_000, 10_000, 100_000]
+
+# Journals and snapshots written by the benchmarks; removed when the process exits
+BENCH_DIR = tempfile.mkdtemp(prefix="bench-")
+atexit.register(shutil.rmtree, BENCH_DIR, ignore_errors=True)
+
+
+def bench_file(suffix):
+    """Path of a new empty file in BENCH_DIR"""
+    fd, path = tempfile.mkstemp(suffix=suffix, dir=BENCH_DIR)
+    os.close(fd)
+    return path
+
+# Header variants seen in hand-edited sheets; all map to the canonical columns
+MESSY_HEADERS = [
+    "Timestamp", " region ", "DIV", "designation", "NAME", "Sex", "Post",
+    "Phone Number", "Reg. Status", "Confirm time", "Reg Id", "Row Version",
+]
+
+FIRST_NAMES = ["Kwame", "Ama", "Kofi", "Akosua", "Yaw", "Abena", "Kojo", "Efua",
+               "Kwabena", "Adwoa", "Kwaku", "Afia", "Emmanuel", "Grace", "Samuel",
+               "Mercy", "Daniel", "Comfort", "Isaac", "Patience"]
+LAST_NAMES = ["Mensah", "Owusu", "Boateng", "Asante", "Osei", "Addo", "Appiah",
+              "Agyeman", "Ansah", "Darko", "Frimpong", "Amoah", "Quaye", "Tetteh",
+              "Nkrumah", "Acheampong", "Badu", "Sarpong", "Ofori", "Danso"]
+POSITIONS = ["Member", "Usher", "Choir", "Pastor", "Deacon", "Secretary", "Treasurer"]
+PHONE_FORMATS = ["0{}{}{}", "0{} {} {}", "+233 {} {} {}", "(0{}) {}-{}", "233{}{}{}"]
+
+
+def phone_number(rng):
+    network = rng.choice(["24", "54", "55", "20", "50", "26", "27"])
+    return rng.choice(PHONE_FORMATS).format(
+        network, rng.randint(100, 999), rng.randint(1000, 9999))
+
+
+def participant_row(rng, now):
+    """One registration as the form would write it, with sheet-style noise"""
+    region = rng.choice(list(reg_div))
+    status = rng.choice(["", "", "", "Confirmed", " confirmed", "CONFIRMED "])
+    return [
+        (now - timedelta(minutes=rng.randint(0, 60 * 24 * 14))).strftime("%Y-%m-%d %H:%M:%S"),
+        region,
+        rng.choice(reg_div[region]),
+        rng.choice(designation_levels),
+        # A small name pool gives plenty of duplicate and near-duplicate names
+        f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}" + rng.choice(["", "", " Jnr", " Snr"]),
+        rng.choice(genders),
+        rng.choice(POSITIONS),
+        phone_number(rng),
+        status,
+        now.strftime("%a %d %b, %H:%M") if status else "",
+        new_registration_id(),
+        "1",
+    ]
+
+
+def generate_rows(n, seed=0):
+    rng = random.Random(seed)
+    now = datetime(2026, 1, 1)
+    return [participant_row(rng, now) for _ in range(n)]
+
+
+def make_worksheet(rows):
+    """In-memory worksheet holding the messy header row and ``rows``"""
+    worksheet = SQLiteStorage(":memory:", "bench")
+    worksheet.update([MESSY_HEADERS])
+    worksheet.append_rows(rows)
+    return worksheet
+
+
+def measure(func, repeat, setup=None):
+    """Best wall time over ``repeat`` runs and peak traced memory of one more run
+
+    ``setup``, if given, runs untimed before each run and its result is
+    passed to ``func``.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        args = setup() if setup else None
+        start = time.perf_counter()
+        func(args) if setup else func()
+        best = min(best, time.perf_counter() - start)
+    args = setup() if setup else None
+    tracemalloc.start()
+    try:
+        func(args) if setup else func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+
+def bench_size(n, repeat):
+    """Yield (case, seconds, peak bytes) for each hot path at ``n`` rows"""
+    rows = generate_rows(n)
+    worksheet = make_worksheet(rows)
+    loader = IncrementalLoader(worksheet)
+    df = loader.load()
+    rng = random.Random(1)
+
+    def full_load():
+        IncrementalLoader(worksheet).load()
+    yield "load (full)", *measure(full_load, repeat)
+
+    # A tail refresh after 1% more rows were appended
+    tail_rows = generate_rows(max(1, n // 100), seed=1)
+
+    def loaded_copy():
+        tail = make_worksheet(rows)
+        tail_loader = IncrementalLoader(tail)
+        tail_loader.load()
+        tail.append_rows(tail_rows)
+        tail_loader.loaded_at = 0.0
+        return tail_loader
+    yield "load (tail, +1%)", *measure(lambda tail_loader: tail_loader.load(), repeat, loaded_copy)
+
+    # Cold start from the local snapshot instead of the sheet
+    snapshot_path = bench_file(".arrow")
+    yield "snapshot save", *measure(lambda: save_snapshot(snapshot_path, df, {}), repeat)
+    yield "snapshot load", *measure(lambda: load_snapshot(snapshot_path), repeat)
+
+    yield "metrics (aggregates)", *measure(lambda: Aggregates(df), repeat)
+
+    yield "name index build", *measure(lambda: NameIndex(df["Name"]), repeat)
+    names = NameIndex(df["Name"])
+    name_queries = ["kwame", "Akosua Boateng", "mensa", "Grace Ofori Snr"]
+    yield "name search", *measure(lambda: [names.search(q) for q in name_queries], repeat)
+
+    yield "contact index build", *measure(lambda: ContactIndex(df["Contact"]), repeat)
+    contacts = ContactIndex(df["Contact"])
+    contact_queries = [df["Contact"].iloc[n // 2], "0244", "4567", "024412345"]
+    yield "contact search", *measure(lambda: [contacts.search(q) for q in contact_queries], repeat)
+
+    yield "row index build", *measure(lambda: RowIndex(df), repeat)
+
+    yield "duplicates (all rows)", *measure(lambda: DuplicateFinder().update(df), repeat)
+    # A refresh only compares the appended rows with their blocks
+    grown = concat_frames([df, clean_rows(MESSY_HEADERS, tail_rows, start=len(df))])
+    yield "duplicates (+1% rows)", *measure(lambda finder: finder.update(grown), repeat,
+                                            lambda: DuplicateFinder().update(df))
+
+    yield "time series build", *measure(lambda: RegistrationSeries().update(df), repeat)
+    yield "time series (+1% rows)", *measure(lambda series: series.update(grown), repeat,
+                                             lambda: RegistrationSeries().update(df))
+
+    # A registration delivered by this process reaches the cached frame through
+    # the change feed; the derived structures take the row instead of rebuilding
+    derived = {"aggregates": Aggregates, "name_index": lambda df: NameIndex(df["Name"]),
+               "contact_index": lambda df: ContactIndex(df["Contact"]), "row_index": RowIndex,
+               "time_series": lambda df: RegistrationSeries().update(df)}
+    new_row = generate_rows(1, seed=3)
+
+    def warm_loader():
+        feed_loader = IncrementalLoader(make_worksheet(rows))
+        feed_loader.load()
+        for key, build in derived.items():
+            feed_loader.derived(key, build)
+        return feed_loader
+    yield "append 1 row (change feed)", *measure(lambda feed_loader: feed_loader.extend(n + 2, new_row),
+                                                 repeat, warm_loader)
+
+    # Confirmations are written to a copy so every run starts unconfirmed
+    unconfirmed = df.index[df["Registration Status"] == ""]
+
+    def fresh_copy():
+        target = make_worksheet(rows)
+        return target, IncrementalLoader(target).load()
+
+    def confirm(labels, target, frame):
+        changes = {label: {"Registration Status": "Confirmed", "Confirmation Time": "bench"}
+                   for label in labels}
+        base = {label: {"Registration Status": "", "Confirmation Time": ""} for label in labels}
+        write_rows(target, frame, changes, base, pause=0)
+
+    one = [unconfirmed[rng.randrange(len(unconfirmed))]]
+    yield "confirm 1 row", *measure(lambda copy: confirm(one, *copy), repeat, fresh_copy)
+    bulk = list(unconfirmed[:min(len(unconfirmed), max(1, n // 10))])
+    yield f"confirm {len(bulk)} rows (bulk)", *measure(lambda copy: confirm(bulk, *copy), repeat, fresh_copy)
+
+    # Registration submit: journal append per row, then delivery by the flusher
+    submissions = generate_rows(min(n, 1_000), seed=2)
+
+    queues = []
+
+    def fresh_queue():
+        # Each run gets its own journal; the flusher wakes on submit, not on a timer.
+        # The previous run's flusher is stopped first.
+        while queues:
+            queues.pop().close()
+        journal = RegistrationJournal(bench_file(".db"))
+        target = make_worksheet([])
+        queues.append(RegistrationQueue(lambda title: target, journal, flush_interval=3600))
+        return queues[-1]
+
+    def submit(queue):
+        for row in submissions:
+            queue.submit(row)
+        while queue.pending_count():
+            time.sleep(0.005)
+    yield f"submit {len(submissions)} + deliver", *measure(submit, repeat, fresh_queue)
+    while queues:
+        queues.pop().close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="also write the report to this file")
+    args = parser.parse_args()
+
+    lines = [f"{'rows':>8}  {'case':<28} {'best ms':>10} {'peak MiB':>10}"]
+    print(lines[0], flush=True)
+    for n in args.sizes:
+        for case, seconds, peak in bench_size(n, args.repeat):
+            line = f"{n:>8}  {case:<28} {seconds * 1000:>10.1f} {peak / 2**20:>10.1f}"
+            lines.append(line)
+            print(line, flush=True)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write("\n".join(lines) + "\n")
+
+
+if __name__ == "__main__":
+    main()
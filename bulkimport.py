@@ -0,0 +1,174 @@
+import io
+from datetime import datetime
+import pandas as pd
+import streamlit as st
+from config import reg_div, genders, designation_levels
+from headers import canonical_headers
+from rowids import new_registration_id
+from shards import is_sharded, worksheet_title
+from storage import open_worksheet
+from workersdata import REQUIRED_HEADERS, check_headers, get_registration_queue, get_registration_registry
+
+# Columns an uploaded list must have once its headers are mapped
+IMPORT_COLUMNS = ['Region', 'Division', 'Designation Level', 'Name', 'Gender', 'Position', 'Contact']
+
+def read_upload(name, data):
+    """An uploaded CSV or Excel file as stripped text under the dashboard's column names
+
+    The index is the line number in the file, so reject reports point at
+    the row to fix.
+    """
+    if name.lower().endswith('.xlsx'):
+        # Needs openpyxl
+        df = pd.read_excel(io.BytesIO(data), dtype=str)
+    else:
+        df = pd.read_csv(io.BytesIO(data), dtype=str, keep_default_na=False)
+    df.columns = canonical_headers(df.columns)
+    df = df.loc[:, ~df.columns.duplicated()].fillna('')
+    df = df.apply(lambda col: col.str.strip())
+    df.index = pd.RangeIndex(2, 2 + len(df))
+    # Spreadsheets often end with blank lines
+    return df[(df != '').any(axis=1)]
+
+def _lookup(values, options):
+    """``values`` matched case-insensitively to ``options``; '' where nothing matches"""
+    canonical = {option.lower(): option for option in options}
+    return values.str.lower().map(canonical).fillna('')
+
+def contact_keys(contacts):
+    """contact_key over a whole column"""
+    digits = contacts.str.replace(r'\D', '', regex=True)
+    digits = digits.mask(digits.str.startswith('233') & (digits.str.len() == 12), '0' + digits.str[3:])
+    # Spreadsheet apps drop the leading zero of numbers typed as numbers
+    return digits.mask((digits.str.len() == 9) & ~digits.str.startswith('0'), '0' + digits)
+
+def validate_rows(df, registry):
+    """Split an uploaded list into (accepted, rejected) frames
+
+    Every check runs over whole columns at once. ``accepted`` holds the
+    cleaned values; ``rejected`` holds the uploaded values with a Reason
+    column. Rows repeating a contact, or a name within a division, that is
+    already registered or appears earlier in the file are rejected.
+    """
+    missing = [col for col in IMPORT_COLUMNS if col not in df.columns]
+    if missing:
+        raise ValueError(f"Missing column(s): {', '.join(missing)}")
+
+    clean = pd.DataFrame(index=df.index)
+    clean['Region'] = _lookup(df['Region'], reg_div)
+    divisions = {f"{region}|{division.lower()}": division
+                 for region, names in reg_div.items() for division in names}
+    clean['Division'] = (clean['Region'] + '|' + df['Division'].str.lower()).map(divisions).fillna('')
+    clean['Designation Level'] = _lookup(df['Designation Level'], designation_levels)
+    clean['Name'] = df['Name'].str.split().str.join(' ').str.title()
+    clean['Gender'] = _lookup(df['Gender'], genders)
+    clean['Position'] = df['Position'].str.title()
+    clean['Contact'] = contact_keys(df['Contact'])
+
+    contacts, names = registry.keys()
+    name_keys = pd.MultiIndex.from_arrays([clean['Name'].str.lower(), clean['Division'].str.lower()])
+    valid_contact = clean['Contact'].str.fullmatch(r'\d{10}')
+    checks = [
+        (clean['Name'] == '', "Name is missing"),
+        (clean['Region'] == '', "Unknown region"),
+        ((clean['Region'] != '') & (clean['Division'] == ''), "Division not in region"),
+        (clean['Designation Level'] == '', "Unknown designation level"),
+        (clean['Gender'] == '', "Unknown gender"),
+        (clean['Position'] == '', "Position is missing"),
+        (~valid_contact, "Contact is not a 10-digit number"),
+        (valid_contact & clean['Contact'].isin(contacts), "Contact already registered"),
+        (valid_contact & clean['Contact'].duplicated(), "Contact repeated in file"),
+        (name_keys.isin(names), "Name already registered in division"),
+        (name_keys.duplicated(), "Name repeated in division in file"),
+    ]
+    reasons = pd.Series('', index=df.index)
+    for mask, reason in checks:
+        reasons = reasons.mask(mask, reasons + '; ' + reason)
+    reasons = reasons.str.lstrip('; ')
+
+    rejected = df[reasons != ''].assign(Reason=reasons[reasons != ''])
+    return clean[reasons == ''], rejected
+
+def import_rows(accepted, registry, queue):
+    """Queue validated rows for their worksheets; returns (queued, skipped)
+
+    Rows are claimed in the registry first, so someone registering at a
+    desk meanwhile is not added twice. Each worksheet gets one journal
+    transaction, which the queue appends in multi-row batches.
+    """
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    rows = accepted.assign(**{
+        'Timestamp': now,
+        'Registration Status': '',
+        'Confirmation Time': '',
+        'Registration ID': [new_registration_id() for _ in range(len(accepted))],
+        'Row Version': 1,
+    })
+    claimed = [
+        registry.claim(contact, name, division, registration_id) is None
+        for contact, name, division, registration_id
+        in zip(rows['Contact'], rows['Name'], rows['Division'], rows['Registration ID'])
+    ]
+    rows = rows[claimed]
+
+    for title, group in rows.groupby(rows['Region'].map(worksheet_title)):
+        headers = check_headers(open_worksheet(title, create=is_sharded()))
+        values = group.reindex(columns=REQUIRED_HEADERS).reindex(columns=canonical_headers(headers), fill_value='')
+        queue.submit_many(values.values.tolist(), title)
+    return len(rows), len(accepted) - len(rows)
+
+def import_page():
+    st.subheader("📥 Bulk Import")
+    st.caption("Upload a participant list (CSV or Excel) with columns for "
+               f"{', '.join(IMPORT_COLUMNS)}.")
+
+    upload = st.file_uploader("Participant list", type=['csv', 'xlsx'])
+    if upload is None:
+        return
+
+    try:
+        df = read_upload(upload.name, upload.getvalue())
+    except ImportError:
+        st.error("Reading Excel files needs the openpyxl package; upload a CSV instead.")
+        return
+    except Exception as e:
+        st.error(f"Could not read {upload.name}: {str(e)}")
+        return
+
+    try:
+        registry = get_registration_registry()
+        accepted, rejected = validate_rows(df, registry)
+    except ValueError as e:
+        st.error(str(e))
+        return
+    except Exception as e:
+        st.error(f"Loading existing registrations failed: {str(e)}")
+        return
+
+    cols = st.columns(2)
+    cols[0].metric("Ready to import", len(accepted))
+    cols[1].metric("Rejected", len(rejected))
+
+    if len(rejected):
+        st.write("**Rejected rows**")
+        report = rejected.rename_axis('Row').reset_index()
+        st.dataframe(report, hide_index=True, use_container_width=True)
+        st.download_button("Download reject report", report.to_csv(index=False),
+                           file_name=f"rejected_{upload.name.rsplit('.', 1)[0]}.csv", mime="text/csv")
+
+    if accepted.empty:
+        st.info("No rows to import")
+        return
+
+    with st.expander("Preview rows to import"):
+        st.dataframe(accepted, use_container_width=True)
+
+    if st.button(f"Import {len(accepted)} participant(s)", type="primary", key="bulk_import"):
+        try:
+            queue = get_registration_queue()
+            queued, skipped = import_rows(accepted, registry, queue)
+            st.success(f"✅ {queued} participant(s) queued; {queue.pending_count()} waiting to sync")
+            if skipped:
+                st.warning(f"{skipped} participant(s) registered at a desk meanwhile were skipped")
+        except Exception as e:
+            st.error(f"Import failed: {str(e)}")
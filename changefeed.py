@@ -0,0 +1,67 @@
+import queue
+import threading
+from collections import namedtuple
+from metrics import metrics
+
+# Rows a worksheet accepted at its end; ``first_row`` is the 1-based sheet row
+# of rows[0], or None when the sheet did not say where they went
+RowsAppended = namedtuple('RowsAppended', ['worksheet', 'first_row', 'rows'])
+
+# Cells written to existing rows: {sheet row: {column: value}}
+RowsChanged = namedtuple('RowsChanged', ['worksheet', 'changes'])
+
+
+class ChangeFeed:
+    """In-process publish/subscribe of row writes the worksheets have accepted
+
+    Writers publish only after the sheet accepted a write, so subscribers
+    never see a row the sheet does not have. Events are delivered in order
+    on one background thread, so a slow subscriber never holds up the
+    registration flusher or a confirmation. A subscriber that raises is
+    counted and skipped; the others still get the event.
+    """
+
+    def __init__(self):
+        self._subscribers = []
+        self._events = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def subscribe(self, callback):
+        """Call ``callback(event)`` for every event published from now on"""
+        with self._lock:
+            self._subscribers.append(callback)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="change-feed", daemon=True)
+                self._thread.start()
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def publish(self, event):
+        metrics.inc("change_feed_events_total", kind=type(event).__name__)
+        # Nobody listening (e.g. a registration-only kiosk): nothing to queue
+        if self._subscribers:
+            self._events.put(event)
+
+    def join(self):
+        """Wait until every event published so far has been delivered"""
+        self._events.join()
+
+    def _run(self):
+        while True:
+            event = self._events.get()
+            with self._lock:
+                subscribers = list(self._subscribers)
+            for callback in subscribers:
+                try:
+                    callback(event)
+                except Exception:
+                    metrics.inc("change_feed_errors_total", kind=type(event).__name__)
+            self._events.task_done()
+
+
+# One feed per process, shared by every writer and every dashboard session
+feed = ChangeFeed()
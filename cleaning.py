@@ -0,0 +1,100 @@
+import pandas as pd
+from pandas.api.types import union_categoricals
+from config import reg_div, genders, designation_levels
+# Header mapping lives in its own module so the registration form can use it without pandas
+from headers import canonical_headers
+
+# Add default columns if missing
+REQUIRED_COLUMNS = {
+    'Region': '',
+    'Division': '',
+    'Designation Level': '',
+    'Name': '',
+    'Gender': '',
+    'Position': '',
+    'Contact': '',
+    'Registration Status': '',  # Keep empty until confirmed
+    'Confirmation Time': '',
+    'Registration ID': '',
+    'Row Version': ''
+}
+
+# Convert all columns to string to avoid ArrowTypeError
+TEXT_COLUMNS = ['Region', 'Division', 'Designation Level', 'Name',
+                'Gender', 'Position', 'Contact', 'Registration Status']
+
+# Low-cardinality columns stored as categoricals, seeded with the form's options.
+# Values outside these sets are kept and added as extra categories.
+CATEGORIES = {
+    'Region': list(reg_div),
+    'Division': [division for divisions in reg_div.values() for division in divisions],
+    'Designation Level': designation_levels,
+    'Gender': genders,
+    'Registration Status': ['Confirmed'],
+}
+
+def normalize_contacts(contacts):
+    """Strip formatting from contact numbers, keeping a leading '+'"""
+    contacts = contacts.astype(str)
+    digits = contacts.str.replace(r'\D', '', regex=True)
+    return digits.mask(contacts.str.startswith('+'), '+' + digits)
+
+def to_category(values, seed):
+    """Categorical column with the seeded categories first, then any others seen"""
+    extra = sorted(set(values.unique()) - set(seed) - {''})
+    return values.astype(pd.CategoricalDtype(list(dict.fromkeys([''] + list(seed) + extra))))
+
+def set_values(df, labels, col, values):
+    """Set one column's cells at ``labels``, adding new values to a categorical column's categories"""
+    column = df[col]
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        new = set(values) - set(column.cat.categories)
+        if new:
+            df[col] = column.cat.add_categories(sorted(new))
+    df.loc[labels, col] = values
+
+def concat_frames(frames):
+    """Concatenate cleaned frames, merging categories instead of falling back to object"""
+    frames = [frame for frame in frames if frame is not None]
+    for col in CATEGORIES:
+        if all(isinstance(frame[col].dtype, pd.CategoricalDtype) for frame in frames):
+            categories = union_categoricals([frame[col] for frame in frames]).categories
+            dtype = pd.CategoricalDtype(categories)
+            frames = [frame.assign(**{col: frame[col].astype(dtype)}) for frame in frames]
+    return pd.concat(frames)
+
+def clean_rows(headers, rows, start=0):
+    """Build the cleaned participant DataFrame from raw worksheet rows
+
+    ``start`` is the position of the first row below the header, so the
+    index of the result always maps to sheet row ``index + 2``.
+    """
+    # Pad ragged rows so every row has a value for every header
+    width = len(headers)
+    rows = [list(row[:width]) + [''] * (width - len(row)) for row in rows]
+    df = pd.DataFrame(rows, columns=canonical_headers(headers),
+                      index=pd.RangeIndex(start, start + len(rows)))
+
+    for col, default_val in REQUIRED_COLUMNS.items():
+        if col not in df.columns:
+            df[col] = default_val
+
+    for col in TEXT_COLUMNS:
+        if df[col].dtype != object:
+            df[col] = df[col].astype(str)
+
+    # Convert registration status to consistent format
+    df['Registration Status'] = (
+        df['Registration Status']
+        .str.strip()
+        .str.title()
+        .replace({'Nan': '', 'Na': '', 'None': ''})
+    )
+
+    # Normalize contact numbers
+    df['Contact'] = normalize_contacts(df['Contact'])
+
+    for col, seed in CATEGORIES.items():
+        df[col] = to_category(df[col], seed)
+
+    return df
@@ -24,4 +24,7 @@ reg_div = {
     "Tema": ["Tema div", "Ashaiman", "Teshie-Nungua"],
     "Wa": ["Bole", "Wa div", "Tumu"]
 }
-    
\ No newline at end of file
+
+genders = ["Male", "Female"]
+
+designation_levels = ["National", "Regional", "Divisional", "Group", "District", "Local"]
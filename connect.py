@@ -1,5 +1,7 @@
 
 import os
+import threading
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from oauth2client.service_account import ServiceAccountCredentials
 import gspread
@@ -41,3 +43,89 @@ def cred():
     # Authorize and return the client
     client = gspread.authorize(creds)
     return client
+
+
+class SheetsConnection:
+    """Process-wide authorized client with cached spreadsheet and worksheet handles"""
+
+    def __init__(self, spreadsheet_name="mini_congress", refresh_margin=300):
+        self.spreadsheet_name = spreadsheet_name
+        # Refresh the access token this many seconds before it expires
+        self.refresh_margin = timedelta(seconds=refresh_margin)
+        self._lock = threading.RLock()
+        self._client = None
+        self._spreadsheets = {}
+        self._worksheets = {}
+
+    def _credentials(self):
+        # gspread 6 keeps credentials on the HTTP client, older versions on the client
+        http_client = getattr(self._client, "http_client", None)
+        return getattr(http_client, "auth", None) or getattr(self._client, "auth", None)
+
+    def _refresh_if_expiring(self):
+        creds = self._credentials()
+        expiry = getattr(creds, "token_expiry", None) or getattr(creds, "expiry", None)
+        if expiry is None or expiry - datetime.utcnow() > self.refresh_margin:
+            return
+
+        try:
+            if hasattr(creds, "token_expiry"):
+                # oauth2client credentials
+                import httplib2
+                creds.refresh(httplib2.Http())
+            else:
+                from google.auth.transport.requests import Request
+                creds.refresh(Request())
+        except Exception:
+            # Start over with a fresh client if the token cannot be refreshed in place
+            self.reset()
+
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                self._client = cred()
+            else:
+                self._refresh_if_expiring()
+                if self._client is None:
+                    self._client = cred()
+            return self._client
+
+    def spreadsheet(self, name=None):
+        name = name or self.spreadsheet_name
+        with self._lock:
+            client = self.client()
+            if name not in self._spreadsheets:
+                self._spreadsheets[name] = client.open(name)
+            return self._spreadsheets[name]
+
+    def worksheet(self, title="national_wk", spreadsheet_name=None, create=False):
+        key = (spreadsheet_name or self.spreadsheet_name, title)
+        with self._lock:
+            spreadsheet = self.spreadsheet(key[0])
+            if key not in self._worksheets:
+                try:
+                    self._worksheets[key] = spreadsheet.worksheet(title)
+                except gspread.WorksheetNotFound:
+                    if not create:
+                        raise
+                    self._worksheets[key] = spreadsheet.add_worksheet(title=title, rows=1000, cols=26)
+            return self._worksheets[key]
+
+    def reset(self):
+        """Drop the client and every cached handle; they are reopened on next use"""
+        with self._lock:
+            self._client = None
+            self._spreadsheets.clear()
+            self._worksheets.clear()
+
+
+_connection = None
+_connection_lock = threading.Lock()
+
+def get_connection():
+    """Shared connection used by the registration form, the dashboard and background workers"""
+    global _connection
+    with _connection_lock:
+        if _connection is None:
+            _connection = SheetsConnection()
+        return _connection
@@ -1,127 +1,237 @@
+import os
 import streamlit as st
 import pandas as pd
 from datetime import datetime
-from rapidfuzz import process, fuzz
-from connect import cred
-import gspread
+from storage import open_worksheet
 import time
-import re
+import math
+import zlib
+from changefeed import RowsAppended, feed
+from cleaning import clean_rows
+from loader import IncrementalLoader, ShardedLoader
+from snapshot import SNAPSHOT_PATH
+from search import ContactIndex, NameIndex
+from aggregates import MERGED, Aggregates
+from duplicates import DismissalStore, DuplicateFinder
+from timeseries import FREQUENCIES, RegistrationSeries, format_minutes
+from rowids import ID_COLUMN, RowIndex, backfill_registration_ids
+from tableview import PAGE_SIZES, SortOrder, StatusStyles
+from writeback import VERSION_COLUMN, WriteResult, parse_version, write_rows
+from metrics import metrics
+from scheduler import CONFIRMATION, DASHBOARD
+from shards import NATIONAL_WORKSHEET, REGIONS, is_sharded, shard_offset, split_label
+from quotanotice import sheets_priority
+
+# Duplicate groups listed at once; merging or dismissing one brings in the next
+DUPLICATE_GROUPS_SHOWN = 20
+
+# How often an open dashboard checks for changes published by other sessions
+# (seconds); 0 turns live updates off
+LIVE_UPDATE_SECONDS = float(os.getenv("LIVE_UPDATE_SECONDS", "5"))
+
+class DashboardService:
+    """Participant data and write-back shared by every dashboard session
+
+    One instance lives for the whole process. It owns the worksheet handle,
+    the incremental loader and the structures derived from the frame, and
+    makes no Streamlit calls; each session's RegistrationDashboard keeps
+    only its own UI state and pending edits. Registrations and
+    confirmations written anywhere in the process reach the frame through
+    the change feed, without reading the sheet.
+    """
+
+    def __init__(self, title=NATIONAL_WORKSHEET):
+        # A restart serves the local snapshot while the sheet is read in the
+        # background. Rows registered before IDs existed get a stable ID
+        # before the first sheet read.
+        if is_sharded():
+            # One worksheet per region, fetched in parallel and merged
+            self.worksheets = {region: open_worksheet(region, create=True) for region in REGIONS}
+            self.loader = ShardedLoader(self.worksheets, snapshot_path=SNAPSHOT_PATH,
+                                        prepare=backfill_registration_ids)
+        else:
+            self.worksheet = open_worksheet(title)
+            self.worksheets = {title: self.worksheet}
+            self.loader = IncrementalLoader(self.worksheet, snapshot_path=SNAPSHOT_PATH,
+                                            prepare=lambda: backfill_registration_ids(self.worksheet))
+        self.dismissals = DismissalStore()
+        feed.subscribe(self.apply_change)
+
+    def apply_change(self, event):
+        """Apply a row write published on the change feed to the frame and its derived structures"""
+        if event.worksheet not in self.worksheets:
+            return
+        if isinstance(event, RowsAppended):
+            if is_sharded():
+                self.loader.extend(event.worksheet, event.first_row, event.rows)
+            else:
+                self.loader.extend(event.first_row, event.rows)
+            return
+        offset = shard_offset(event.worksheet) if is_sharded() else 0
+        # Writes this process made are already patched in; patching is idempotent
+        self.loader.patch({sheet_row - 2 + offset: values for sheet_row, values in event.changes.items()})
+
+    def frame(self, region=None):
+        """The participant frame; with region shards, only ``region``'s worksheet is refreshed if given"""
+        if is_sharded() and region in self.worksheets:
+            return self.loader.load(regions=[region])
+        return self.loader.load()
+
+    def _split(self, labels):
+        """(worksheet, label offset, frame labels) for each worksheet holding some of ``labels``"""
+        if not is_sharded():
+            return [(self.worksheet, 0, list(labels))]
+        groups = {}
+        for label in labels:
+            region, _ = split_label(label)
+            groups.setdefault(region, []).append(label)
+        return [(self.worksheets[region], shard_offset(region), group) for region, group in groups.items()]
+
+    def row_index(self):
+        return self.loader.derived('row_index', RowIndex)
+
+    def aggregates(self):
+        return self.loader.derived('aggregates', Aggregates)
+
+    def name_index(self):
+        return self.loader.derived('name_index', lambda df: NameIndex(df['Name']))
+
+    def contact_index(self):
+        return self.loader.derived('contact_index', lambda df: ContactIndex(df['Contact']))
+
+    def sort_order(self, column):
+        return self.loader.derived(f'sort_{column}', lambda df: SortOrder(df, column))
+
+    def status_styles(self):
+        return self.loader.derived('status_styles', StatusStyles)
+
+    def time_series(self):
+        return self.loader.derived('time_series', lambda df: RegistrationSeries().update(df))
+
+    def duplicate_clusters(self):
+        """Possible duplicate participants not yet merged or dismissed"""
+        finder = self.loader.derived('duplicates', lambda df: DuplicateFinder().update(df))
+        return finder.clusters(self.loader.df, self.dismissals.pairs())
+
+    def write(self, df, changes, base):
+        """Conditionally write ``changes`` made against ``df``; see writeback.write_rows"""
+        result = WriteResult()
+        for worksheet, offset, labels in self._split(changes):
+            # Each worksheet is written with the labels of its own rows
+            local = [label - offset for label in labels]
+            part = write_rows(worksheet, df.loc[labels].set_axis(local),
+                              {label - offset: changes[label] for label in labels},
+                              {label - offset: base[label] for label in labels})
+            result.applied.update({label + offset: values for label, values in part.applied.items()})
+            result.conflicts += [label + offset for label in part.conflicts]
+            result.missing += [label + offset for label in part.missing]
+            result.relocated = result.relocated or part.relocated
+        # Patch the shared frame and its counts with what the sheet now holds
+        if result.relocated or result.missing:
+            self.loader.invalidate()
+        else:
+            self.loader.patch(result.applied)
+        return result
+
+    def backfill_ids(self):
+        count = sum(backfill_registration_ids(worksheet) for worksheet in self.worksheets.values())
+        self.loader.invalidate()
+        return count
+
+    def rewrite(self, df):
+        """Rewrite the worksheet (or each region shard) from ``df`` (repair only)
+
+        Rows appended or updated by others since ``df`` was loaded are merged
+        in by registration ID, and the repair lock keeps the registration
+        queue from appending between the clear and the rewrite.
+        """
+        for worksheet, _, labels in self._split(df.index):
+            self._rewrite_worksheet(worksheet, df.loc[labels])
+        self.loader.invalidate()
+
+    def _rewrite_worksheet(self, worksheet, df):
+        with worksheet.write_lock, worksheet.repair_lock:
+            values = worksheet.get_all_values()
+            # Blank rows are dropped by the rewrite
+            filled = [row for row in values[1:] if any(cell != '' for cell in row)]
+            current = clean_rows(values[0], filled) if values else df.iloc[:0]
+            
+            # Remove temporary columns; everything is written back as text
+            df_to_update = df.copy()
+            if 'match_score' in df_to_update.columns:
+                df_to_update = df_to_update.drop(columns=['match_score'])
+            df_to_update = df_to_update.astype(str)
+            current = current.reindex(columns=df_to_update.columns, fill_value='').astype(str)
+            
+            # A row without an ID cannot be matched between the sheet and this
+            # copy, so rewriting would write it twice
+            if (current[ID_COLUMN] == '').any() or (df_to_update[ID_COLUMN] == '').any():
+                raise ValueError("Some rows have no registration ID; run the ID backfill "
+                                 "under Maintenance before rewriting")
+            
+            # Prefer the sheet's copy of rows another desk has updated since
+            sheet_rows = current[current[ID_COLUMN] != ''].drop_duplicates(ID_COLUMN).set_index(ID_COLUMN, drop=False)
+            sheet_version = df_to_update[ID_COLUMN].map(sheet_rows[VERSION_COLUMN].map(parse_version))
+            newer = sheet_version > df_to_update[VERSION_COLUMN].map(parse_version)
+            if newer.any():
+                df_to_update.loc[newer] = sheet_rows.loc[df_to_update.loc[newer, ID_COLUMN]].values
+            
+            # Keep rows that are not in this copy (e.g. new registrations)
+            unknown = ~current[ID_COLUMN].isin(df_to_update[ID_COLUMN])
+            df_to_update = pd.concat([df_to_update, current[unknown]])
+            
+            # Update the worksheet
+            worksheet.clear()
+            worksheet.update([df_to_update.columns.tolist()] + df_to_update.values.tolist())
+
+@st.cache_resource
+def get_dashboard_service():
+    # One service per process; sessions share its data and caches
+    return DashboardService()
 
 class RegistrationDashboard:
-    def __init__(self):
-        self.client = self.get_google_client()
-        self.national_ws = self.get_worksheet()
+    """One session's dashboard view over the shared DashboardService"""
+
+    def __init__(self, service=None):
+        self.service = service or self.get_service()
         self.df = self.load_and_clean_data()
+        # Cells changed locally since the last write-back: {row index: {column: value}}
+        self.pending_changes = {}
+        # Values those cells had when they were read
+        self.pending_base = {}
     
-    @st.cache_resource(show_spinner="Connecting to Google Sheets...")
-    def get_google_client(_self):
-        try:
-            return cred()
-        except Exception as e:
-            st.error(f"Connection initialization failed: {e}")
-            st.stop()
-    
-    def get_worksheet(self):
+    def get_service(self):
         try:
-            spreadsheet = self.client.open("mini_congress")
-            national_ws = spreadsheet.worksheet("national_wk")
+            # Built once per process; reruns reuse its worksheet handle and data
+            service = get_dashboard_service()
             st.success("Database Connected!")
-            return national_ws
+            return service
         except Exception as e:
             st.error(f"Worksheet access failed: {e}")
             st.stop()
     
-    @st.cache_data(ttl=60, show_spinner="Loading participant data...")
-    def load_and_clean_data(_self):
+    def load_and_clean_data(self):
         try:
-            # Load worksheet
-            records = _self.national_ws.get_all_records()
-            df = pd.DataFrame(records)
+            # Only rows appended since the last refresh are fetched and cleaned.
+            # The frame is shared by every session and only changes through
+            # loader.patch after a successful write, so it is not copied here.
+            with st.spinner("Loading participant data..."), sheets_priority(DASHBOARD):
+                with metrics.timed('dashboard_section_seconds', section='load'):
+                    loader = self.service.loader
+                    # With region shards, a region-filtered view only refreshes that region
+                    df = self.service.frame(st.session_state.get('region_filter'))
+                    self.data_version = loader.version
             
             if df.empty:
                 st.error("No data found in the Google Sheets")
                 st.stop()
-                
-            # Normalize column names - handle variations
-            def normalize_col_name(col):
-                col = str(col).strip()
-                col = re.sub(r'[^a-zA-Z0-9\s]', ' ', col)  # Replace special chars with space
-                col = re.sub(r'\s+', ' ', col)  # Collapse multiple spaces
-                return col.title().strip()
-            
-            df.columns = [normalize_col_name(col) for col in df.columns]
-            
-            # Enhanced column mapping with fuzzy matching
-            column_mapping = {
-                'Regstatus': 'Registration Status',
-                'Reg Status': 'Registration Status',
-                'Status': 'Registration Status',
-                'Confirmationstatus': 'Registration Status',
-                'Confirmstatus': 'Registration Status',
-                'Confirmtime': 'Confirmation Time',
-                'Confirm Time': 'Confirmation Time',
-                'Confirmdate': 'Confirmation Time',
-                'Contactinfo': 'Contact',
-                'Contact Info': 'Contact',
-                'Phone': 'Contact',
-                'Mobile': 'Contact',
-                'Phonenumber': 'Contact',
-                'Phone Number': 'Contact',
-                'Designation': 'Designation Level',
-                'Designationlevel': 'Designation Level',
-                'Pos': 'Position',
-                'Post': 'Position',
-                'Div': 'Division',
-                'Dept': 'Division',
-                'Gender': 'Gender',
-                'Sex': 'Gender'
-            }
-            
-            # Apply column name mapping
-            df.rename(columns=column_mapping, inplace=True)
-            
-            # Add default columns if missing
-            required_columns = {
-                'Region': '',
-                'Division': '',
-                'Designation Level': '',
-                'Name': '',
-                'Gender': '',
-                'Position': '',
-                'Contact': '',
-                'Registration Status': '',  # Keep empty until confirmed
-                'Confirmation Time': ''
-            }
-            
-            for col, default_val in required_columns.items():
-                if col not in df.columns:
-                    df[col] = default_val
-            
-            # Convert all columns to string to avoid ArrowTypeError
-            text_columns = ['Region', 'Division', 'Designation Level', 'Name', 
-                           'Gender', 'Position', 'Contact', 'Registration Status']
-            
-            for col in text_columns:
-                if col in df.columns:
-                    df[col] = df[col].astype(str)
-            
-            # Convert registration status to consistent format
-            df['Registration Status'] = (
-                df['Registration Status']
-                .str.strip()
-                .str.title()
-                .replace({'Nan': '', 'Na': '', 'None': '', '': ''})
-            )
             
-            # Normalize contact numbers
-            def normalize_contact(contact):
-                contact = str(contact)
-                # Remove all non-digit characters except '+' at start
-                if contact.startswith('+'):
-                    return '+' + re.sub(r'\D', '', contact[1:])
-                return re.sub(r'\D', '', contact)
-            
-            df['Contact'] = df['Contact'].apply(normalize_contact)
+            # Say when the data is older than the sheet
+            synced = datetime.fromtimestamp(loader.synced_at).strftime('%H:%M') if loader.synced_at else 'unknown'
+            if loader.last_error is not None:
+                st.warning(f"Google Sheets is unreachable ({loader.last_error}); showing data from {synced}.")
+            elif loader.from_snapshot:
+                st.caption(f"Showing saved data from {synced} while the latest is fetched from Google Sheets.")
             
             return df
         
@@ -129,26 +239,26 @@ class RegistrationDashboard:
             st.error(f"Data loading failed: {e}")
             st.stop()
     
+    def report_missing_ids(self, ids):
+        missing = int((ids == '').sum())
+        if missing:
+            st.caption(f"{missing} participant(s) without a registration ID are hidden; "
+                       "run the ID backfill under Maintenance.")
+    
     def build_metrics(self):
         st.subheader("📊 Registration Dashboard")
         with st.container(border=True):
             cols = st.columns(3)
             
-            # Calculate metrics
-            total_participants = len(self.df)
-            
-            # Count confirmed participants (non-empty status)
-            confirmed_count = self.df[self.df['Registration Status'] == 'Confirmed'].shape[0]
-            
-            # Count unconfirmed as those with empty status
-            unconfirmed_count = total_participants - confirmed_count
+            # Calculate metrics from the materialized counts
+            aggregates = self.service.aggregates()
+            total_participants = aggregates.total
+            confirmed_count = aggregates.confirmed
             confirmation_rate = (confirmed_count / total_participants) * 100 if total_participants else 0
             
             # Gender breakdown (only confirmed participants)
-            confirmed_df = self.df[self.df['Registration Status'] == 'Confirmed']
-            gender_counts = confirmed_df['Gender'].value_counts()
-            male_count = gender_counts.get('Male', 0)
-            female_count = gender_counts.get('Female', 0)
+            male_count = aggregates.count('Gender', 'Male', confirmed=True)
+            female_count = aggregates.count('Gender', 'Female', confirmed=True)
             
             with cols[0]:
                 st.metric("Total Participants", total_participants)
@@ -163,12 +273,34 @@ class RegistrationDashboard:
                 progress_value = int((male_count / confirmed_count * 100) if confirmed_count else 0)
                 st.progress(progress_value, text=f"Male: {male_count}")
     
+    def activity_section(self):
+        with st.expander("📈 Registration activity"):
+            series = self.service.time_series()
+            cols = st.columns(2)
+            interval = cols[0].radio("Interval:", list(FREQUENCIES), horizontal=True, key="activity_interval")
+            by = cols[1].radio("Break down by:", ['Status', 'Region'], horizontal=True, key="activity_by")
+            
+            # Pre-bucketed counts; only rows added since the last refresh were counted
+            table = series.frame(FREQUENCIES[interval], by)
+            if table.empty:
+                st.caption("No registrations with a readable timestamp yet")
+                return
+            st.bar_chart(table)
+            if series.undated:
+                st.caption(f"{series.undated} registration(s) without a readable timestamp are not shown")
+            
+            # Time from registration to confirmation
+            if series.lag.count:
+                cols = st.columns(3)
+                for col, (label, q) in zip(cols, [("median", 0.5), ("90th pct", 0.9), ("99th pct", 0.99)]):
+                    col.metric(f"Confirmation lag ({label})", format_minutes(series.lag.quantile(q)))
+    
     def build_filters(self):
         st.subheader("🔍 Participant Search")
         with st.container(border=True):
             # Region filter - always shown at top
-            region_options = ['All Regions'] + sorted(self.df['Region'].dropna().unique().tolist())
-            selected_region = st.selectbox("Filter by Region:", region_options)
+            region_options = ['All Regions'] + self.service.aggregates().values('Region')
+            selected_region = st.selectbox("Filter by Region:", region_options, key="region_filter")
             
             # Create two columns for search type and search input
             col1, col2 = st.columns([1, 3])
@@ -182,7 +314,7 @@ class RegistrationDashboard:
                 self.search_term = st.text_input("Search term:", placeholder=f"Enter {self.search_type} to search")
             
             # Start with the full dataset
-            self.filtered_df = self.df.copy()
+            self.filtered_df = self.df
             
             # Apply region filter if needed
             if selected_region != 'All Regions':
@@ -191,34 +323,19 @@ class RegistrationDashboard:
             # Apply search filter if search term is provided
             if self.search_term:
                 try:
-                    # Extract search series and convert to string
-                    search_series = self.filtered_df[self.search_type].astype(str)
-                    
                     # Normalize search term
                     search_term = str(self.search_term).strip()
                     
-                    # Special handling for contact numbers
+                    # Contacts and names are matched through cached indexes for this data version
                     if self.search_type == 'Contact':
-                        # Remove non-digit characters from search term
-                        search_term = re.sub(r'\D', '', search_term)
-                        
-                        # Get matches using vectorized processing with token set ratio
-                        matches = process.extract(
-                            search_term,
-                            search_series,
-                            scorer=fuzz.token_set_ratio,
-                            score_cutoff=70,  # Lower threshold for partial matches
-                            limit=None
-                        )
+                        index = self.service.contact_index()
+                        hits = index.search(search_term)
                     else:
-                        # Get matches using vectorized processing for names
-                        matches = process.extract(
-                            search_term.lower(),
-                            search_series.str.lower(),
-                            scorer=fuzz.partial_ratio,
-                            score_cutoff=80,
-                            limit=None
-                        )
+                        index = self.service.name_index()
+                        hits = index.search(search_term, score_cutoff=80)
+                    
+                    in_view = set(self.filtered_df.index)
+                    matches = [(None, score, label) for label, score in hits if label in in_view]
                     
                     if matches:
                         # Create DataFrame from matches
@@ -239,25 +356,42 @@ class RegistrationDashboard:
     def display_results(self):
         st.subheader(f"👥 Participants ({len(self.filtered_df)})")
         with st.container(border=True):
-            # Row styling function: Only color "Registration Status" column
-            def style_registration_status(val):
-                if val == 'Confirmed':
-                    return 'background-color: #d4edda'
-                elif not val or val.strip() == '':  # Empty status (unconfirmed)
-                    return 'background-color: #f8d7da'
-                return ''
-
             # Display results
             if not self.filtered_df.empty:
                 display_cols = ['Name', 'Gender', 'Region', 'Position', 'Contact', 'Registration Status']
                 
-                # Prepare dataframe to display - show "Unconfirmed" for empty status
-                display_df = self.filtered_df[display_cols].copy()
-                display_df['Registration Status'] = display_df['Registration Status'].replace('', 'Unconfirmed')
+                # Paging and sorting controls
+                sort_options = (['Relevance'] if 'match_score' in self.filtered_df.columns else []) + display_cols
+                col1, col2, col3 = st.columns([2, 1, 1])
+                with col1:
+                    sort_by = st.selectbox("Sort by:", sort_options, key="results_sort")
+                with col2:
+                    descending = st.toggle("Descending", key="results_descending")
+                with col3:
+                    page_size = st.selectbox("Rows per page:", PAGE_SIZES, index=1, key="results_page_size")
+                
+                total = len(self.filtered_df)
+                pages = max(1, math.ceil(total / page_size))
+                page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, step=1)
+                
+                # Sort with the cached order for this data version; search results keep their ranking
+                if sort_by == 'Relevance':
+                    labels = self.filtered_df.index.to_numpy()
+                else:
+                    order = self.service.sort_order(sort_by)
+                    labels = order.for_view(self.filtered_df.index, descending)
+                
+                # Only the visible page is built and sent to the browser
+                start = (page - 1) * page_size
+                page_labels = labels[start:start + page_size]
+                status = self.service.status_styles()
+                display_df = self.filtered_df.loc[page_labels, display_cols]
+                display_df['Registration Status'] = status.labels.reindex(page_labels, fill_value='Unconfirmed').values
+                page_styles = status.styles.reindex(page_labels, fill_value='').values
                 
-                # Apply styling
-                styled_df = display_df.style.map(
-                    style_registration_status, subset=['Registration Status']
+                # Apply the precomputed styles to the status column
+                styled_df = display_df.style.apply(
+                    lambda _: page_styles, subset=['Registration Status']
                 )
                 
                 st.dataframe(
@@ -265,6 +399,7 @@ class RegistrationDashboard:
                     height=400,
                     use_container_width=True
                 )
+                st.caption(f"Showing {start + 1}-{start + len(page_labels)} of {total}")
             else:
                 st.warning("No participants found matching your criteria")
         
@@ -289,12 +424,33 @@ class RegistrationDashboard:
             ]
             
             if not unconfirmed_df.empty:
-                # Participant selection
-                participant_list = unconfirmed_df['Name'].tolist()
-                self.selected_name = st.selectbox("Select participant to confirm:", participant_list)
+                # Participant selection by registration ID, so duplicate names stay distinct
+                ids = unconfirmed_df['Registration ID']
+                labels = dict(zip(ids, unconfirmed_df['Name'] + ' - ' + unconfirmed_df['Division'].astype(str)))
+                self.report_missing_ids(ids)
+                options = ids[ids != ''].tolist()
+                # The page reruns as other desks confirm people; never slide the
+                # selection onto someone else when the chosen participant drops out
+                previous = st.session_state.get('individual_select')
+                if previous is not None and previous not in labels:
+                    st.info(f"Participant {previous} is no longer unconfirmed in this view "
+                            "(confirmed at another desk or filtered out).")
+                    del st.session_state['individual_select']
+                self.selected_id = st.selectbox(
+                    "Select participant to confirm:",
+                    options,
+                    index=None,
+                    placeholder="Choose a participant",
+                    format_func=lambda reg_id: f"{labels[reg_id]} ({reg_id})",
+                    key="individual_select"
+                )
+                if self.selected_id is None:
+                    return
                 
                 # Display details
-                participant = unconfirmed_df[unconfirmed_df['Name'] == self.selected_name].iloc[0]
+                idx = self.service.row_index().label(self.selected_id)
+                participant = self.df.loc[idx]
+                self.selected_name = participant['Name']
                 
                 with st.expander("Participant Details:"):
                     st.write(f"**Name:** {participant['Name']}")
@@ -308,21 +464,13 @@ class RegistrationDashboard:
                 # Confirmation button
                 if st.button("Confirm Registration", type="primary", key="individual_confirm"):
                     try:
-                        # Update local DataFrame
-                        idx = self.df.index[self.df['Name'] == self.selected_name].tolist()[0]
-                        
-                        # Only set status when confirming
-                        self.df.at[idx, 'Registration Status'] = 'Confirmed'
-                        self.df.at[idx, 'Confirmation Time'] = datetime.now().strftime("%a %d %b, %H:%M")
-                        
-                        # Update Google Sheets
-                        self.update_source_worksheet()
-                        
-                        # Clear cache to force refresh
-                        st.cache_data.clear()
+                        # Only set status when confirming, then update Google Sheets
+                        self.confirm_rows([idx])
                         
                         # Success feedback
                         st.success(f"✅ {self.selected_name} confirmed successfully!")
+                        # Confirmed here, so the rerun should not report them as gone
+                        st.session_state.pop('individual_select', None)
                         time.sleep(1.0)
                         st.rerun()
                         
@@ -334,58 +482,83 @@ class RegistrationDashboard:
     def bulk_confirmation(self):
         """Confirm multiple participants using a DataFrame with checkboxes"""
         with st.container(border=True):
-            # Get all unconfirmed participants
-            unconfirmed_df = self.df[
-                (self.df['Registration Status'] != 'Confirmed') & 
-                (self.df['Registration Status'].isna() | 
-                 (self.df['Registration Status'] == ''))
-            ]
-            
-            if unconfirmed_df.empty:
+            aggregates = self.service.aggregates()
+            if not aggregates.unconfirmed:
                 st.success("All participants are already confirmed!")
                 return
                 
             # Grouping options
             group_type = st.radio("Group by:", ["Region", "Division"], horizontal=True)
             
-            # Get unique groups
+            # Groups that still have unconfirmed participants
             if group_type == "Region":
-                group_options = ['All Regions'] + sorted(unconfirmed_df['Region'].dropna().unique().tolist())
+                group_options = ['All Regions'] + aggregates.values('Region', unconfirmed=True)
             else:
-                group_options = ['All Divisions'] + sorted(unconfirmed_df['Division'].dropna().unique().tolist())
+                group_options = ['All Divisions'] + aggregates.values('Division', unconfirmed=True)
+            
+            # Unconfirmed participants as a boolean mask over the shared frame
+            unconfirmed = self.df['Registration Status'].isna() | (self.df['Registration Status'] == '')
             
             # Group selection
             selected_group = st.selectbox(f"Select {group_type}:", group_options)
             
             # Filter participants by selected group
             if selected_group.startswith('All'):
-                group_participants = unconfirmed_df
+                group_mask = unconfirmed
             else:
-                if group_type == "Region":
-                    group_participants = unconfirmed_df[unconfirmed_df['Region'] == selected_group]
-                else:
-                    group_participants = unconfirmed_df[unconfirmed_df['Division'] == selected_group]
+                group_mask = unconfirmed & (self.df[group_type] == selected_group)
+            group_count = int(group_mask.sum())
             
-            if group_participants.empty:
+            if not group_count:
                 st.info(f"No unconfirmed participants in {selected_group}")
                 return
                 
             # Show participants count
-            st.info(f"Found {len(group_participants)} unconfirmed participants in {selected_group}")
-            
-            # Prepare DataFrame for editing with checkboxes
-            display_df = group_participants[['Name', 'Region', 'Division', 'Position']].copy()
-            display_df['Select'] = False  # Initialize all as unselected
+            st.info(f"Found {group_count} unconfirmed participants in {selected_group}")
+            
+            # Confirm everything matching the search/region filter without building an editor
+            filter_mask = unconfirmed & self.df.index.isin(self.filtered_df.index)
+            filter_count = int(filter_mask.sum())
+            with st.expander(f"Confirm all {filter_count} unconfirmed participants matching the current filter"):
+                acknowledged = st.checkbox(f"I want to confirm all {filter_count} participants", key="confirm_all_ack")
+                if st.button("Confirm All Matching", key="confirm_all_matching", disabled=not (acknowledged and filter_count)):
+                    try:
+                        confirmed = self.confirm_rows(self.df.index[filter_mask])
+                        st.success(f"✅ Confirmed {confirmed} participants successfully!")
+                        # The next confirm-all needs a fresh acknowledgement, and live updates resume
+                        st.session_state.pop('confirm_all_ack', None)
+                        time.sleep(1.5)
+                        st.rerun()
+                    except Exception as e:
+                        st.error(f"Bulk confirmation failed: {str(e)}")
             
-            # Reset index to use as identifier
-            display_df = display_df.reset_index()
+            # Only one page of the group goes into the editor grid
+            group_participants = self.df.loc[group_mask, ['Registration ID', 'Name', 'Region', 'Division', 'Position']]
+            self.report_missing_ids(group_participants['Registration ID'])
+            group_participants = group_participants[group_participants['Registration ID'] != '']
+            col1, col2 = st.columns(2)
+            with col1:
+                page_size = st.selectbox("Rows per page:", PAGE_SIZES, index=2, key="bulk_page_size")
+            pages = max(1, math.ceil(len(group_participants) / page_size))
+            with col2:
+                page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, step=1, key="bulk_page")
+            
+            # Prepare DataFrame for editing with checkboxes. Ticks are kept by
+            # registration ID: the editor keeps its edits by row position, and
+            # rows move when someone above them is confirmed at another desk.
+            start = (page - 1) * page_size
+            display_df = group_participants.iloc[start:start + page_size].copy()
+            ticked = st.session_state.setdefault('bulk_selected', set())
+            display_df['Select'] = display_df['Registration ID'].isin(ticked)
+            # A different set of rows gets a fresh editor, seeded from the ticks above
+            rows_key = zlib.crc32(''.join(display_df['Registration ID']).encode())
             
             # Create data editor with checkbox column
             st.write("Select participants to confirm:")
             edited_df = st.data_editor(
                 display_df,
                 column_config={
-                    "index": st.column_config.Column("ID", disabled=True),
+                    "Registration ID": st.column_config.Column("ID", disabled=True),
                     "Select": st.column_config.CheckboxColumn(
                         "Select",
                         help="Select participants to confirm",
@@ -399,8 +572,11 @@ class RegistrationDashboard:
                 hide_index=True,
                 use_container_width=True,
                 height=min(400, 35 * len(display_df) + 40),
-                key=f"bulk_editor_{selected_group}"
+                key=f"bulk_editor_{selected_group}_{page}_{rows_key}"
             )
+            page_ids = set(display_df['Registration ID'])
+            ticked -= page_ids
+            ticked |= set(edited_df.loc[edited_df['Select'], 'Registration ID'])
             
             # Count selected participants
             selected_count = edited_df['Select'].sum()
@@ -413,60 +589,193 @@ class RegistrationDashboard:
                     return
                     
                 try:
-                    # Get selected indices
-                    selected_indices = edited_df[edited_df['Select']]['index'].tolist()
-                    
-                    # Update selected participants
-                    for idx in selected_indices:
-                        self.df.at[idx, 'Registration Status'] = 'Confirmed'
-                        self.df.at[idx, 'Confirmation Time'] = datetime.now().strftime("%a %d %b, %H:%M")
+                    # Get selected rows from their registration IDs
+                    row_index = self.service.row_index()
+                    selected_indices = [row_index.label(reg_id) for reg_id in edited_df[edited_df['Select']]['Registration ID']]
                     
-                    # Update Google Sheets
-                    self.update_source_worksheet()
+                    confirmed = self.confirm_rows(selected_indices)
+                    ticked -= page_ids
                     
-                    # Clear cache to force refresh
-                    st.cache_data.clear()
-                    
-                    st.success(f"✅ Confirmed {len(selected_indices)} participants successfully!")
+                    st.success(f"✅ Confirmed {confirmed} participants successfully!")
                     time.sleep(1.5)
                     st.rerun()
                     
                 except Exception as e:
                     st.error(f"Bulk confirmation failed: {str(e)}")
     
+    def confirm_rows(self, labels):
+        """Confirm many rows with one timestamp and one chunked write-back"""
+        self.set_cells(labels, {
+            'Registration Status': 'Confirmed',
+            'Confirmation Time': datetime.now().strftime("%a %d %b, %H:%M")
+        })
+        result = self.update_source_worksheet()
+        return len(result.applied) - len(result.conflicts)
+    
+    def merge_duplicates(self, keep, others):
+        """Mark ``others`` as merged into ``keep``, carrying a confirmation over"""
+        confirmed = [idx for idx in others if self.df.at[idx, 'Registration Status'] == 'Confirmed']
+        if confirmed and self.df.at[keep, 'Registration Status'] != 'Confirmed':
+            self.set_cells([keep], {
+                'Registration Status': 'Confirmed',
+                'Confirmation Time': self.df.at[confirmed[0], 'Confirmation Time']
+            })
+        self.set_cells(others, {'Registration Status': MERGED})
+        return self.update_source_worksheet()
+    
+    def set_cell(self, idx, column, value):
+        """Record a cell change for write-back"""
+        self.set_cells([idx], {column: value})
+    
+    def set_cells(self, labels, values):
+        """Record the same {column: value} changes for many rows
+
+        The shared frame is patched only once the sheet has accepted the write.
+        """
+        # Remember each row's version and values as read, for merging if
+        # another desk changed the row in the meantime
+        read = self.df.loc[labels, list(values) + [VERSION_COLUMN]].to_dict('index')
+        # Rows already pending keep the version and values they were first read with
+        pending = read.keys() & self.pending_base.keys()
+        for idx in pending:
+            read[idx].update(self.pending_base[idx])
+            self.pending_changes[idx].update(values)
+        self.pending_base.update(read)
+        self.pending_changes.update({idx: dict(values) for idx in read.keys() - pending})
+    
     def update_source_worksheet(self):
-        """Update the worksheet with cleaned data"""
+        """Write only the cells changed since the last sync back to the worksheet
+
+        Writes are conditional on each row's version; see writeback.write_rows.
+        """
+        if not self.pending_changes:
+            return WriteResult()
+        
         try:
-            # Remove temporary columns
-            df_to_update = self.df.copy()
-            if 'match_score' in df_to_update.columns:
-                df_to_update = df_to_update.drop(columns=['match_score'])
+            with sheets_priority(CONFIRMATION):
+                result = self.service.write(self.df, self.pending_changes, self.pending_base)
             
-            # Convert all text columns to string before updating
-            text_columns = ['Region', 'Division', 'Designation Level', 'Name', 
-                           'Gender', 'Position', 'Contact', 'Registration Status']
-            for col in text_columns:
-                if col in df_to_update.columns:
-                    df_to_update[col] = df_to_update[col].astype(str)
+            if result.conflicts:
+                st.info(f"{len(result.conflicts)} participant(s) were already updated at another desk; "
+                        "their changes were kept.")
+            if result.missing:
+                st.warning(f"{len(result.missing)} participant(s) are no longer in the worksheet.")
             
-            # Update the worksheet
-            self.national_ws.clear()
-            self.national_ws.update([df_to_update.columns.tolist()] + df_to_update.values.tolist())
+            self.pending_changes = {}
+            self.pending_base = {}
+            return result
+            
+        except Exception as e:
+            st.error(f"Worksheet update failed: {str(e)}")
+            raise
+    
+    def repair_source_worksheet(self):
+        """Rewrite the whole worksheet from the cleaned data (repair only)"""
+        try:
+            with sheets_priority(CONFIRMATION):
+                self.service.rewrite(self.df)
+            
+            self.pending_changes = {}
+            self.pending_base = {}
             
         except Exception as e:
             st.error(f"Worksheet update failed: {str(e)}")
             raise
+    
+    def duplicates_section(self):
+        with st.expander("👥 Possible duplicates"):
+            if not st.toggle("Find near-duplicate participants", key="find_duplicates"):
+                st.caption("Compares names within each division, participants sharing most of a "
+                           "phone number and similar-sounding names.")
+                return
+            
+            with st.spinner("Comparing participants..."):
+                clusters = self.service.duplicate_clusters()
+            if not clusters:
+                st.success("No likely duplicates found")
+                return
+            
+            st.caption(f"{len(clusters)} group(s) of possible duplicates"
+                       + (f"; showing the {DUPLICATE_GROUPS_SHOWN} strongest" if len(clusters) > DUPLICATE_GROUPS_SHOWN else ""))
+            row_index = self.service.row_index()
+            for ids, score in clusters[:DUPLICATE_GROUPS_SHOWN]:
+                labels = [row_index.label(registration_id) for registration_id in ids if registration_id in row_index]
+                if len(labels) < 2:
+                    continue
+                key = ids[0]
+                with st.container(border=True):
+                    st.write(f"**{self.df.at[labels[0], 'Name']}** and {len(labels) - 1} other(s), similarity {score:.0f}")
+                    st.dataframe(self.df.loc[labels, ['Name', 'Division', 'Contact', 'Registration Status', ID_COLUMN]],
+                                 hide_index=True, use_container_width=True)
+                    keep = st.radio("Keep:", labels, key=f"dup_keep_{key}", horizontal=True,
+                                    format_func=lambda idx: f"{self.df.at[idx, 'Name']} ({self.df.at[idx, ID_COLUMN]})")
+                    cols = st.columns(2)
+                    if cols[0].button("Merge into kept participant", key=f"dup_merge_{key}"):
+                        try:
+                            self.merge_duplicates(keep, [idx for idx in labels if idx != keep])
+                            st.rerun()
+                        except Exception as e:
+                            st.error(f"Merge failed: {str(e)}")
+                    if cols[1].button("Not duplicates", key=f"dup_dismiss_{key}"):
+                        self.service.dismissals.dismiss(ids)
+                        st.rerun()
+    
+    def maintenance_section(self):
+        with st.expander("🛠 Maintenance"):
+            if st.button("Backfill registration IDs", key="backfill_ids"):
+                try:
+                    with sheets_priority(CONFIRMATION):
+                        count = self.service.backfill_ids()
+                    st.success(f"Assigned {count} registration ID(s)")
+                except Exception as e:
+                    st.error(f"Backfill failed: {str(e)}")
+            
+
+            st.warning("Rewrites the entire worksheet from the dashboard copy. "
+                       "Use only to repair a damaged sheet.")
+            if st.button("Rewrite worksheet", key="repair_worksheet"):
+                try:
+                    self.repair_source_worksheet()
+                    st.success("Worksheet rewritten")
+                except Exception as e:
+                    st.error(f"Repair failed: {str(e)}")
         
+    def live_updates(self):
+        """Rerun the page once the shared frame has changed, e.g. a new registration
+        or another desk's confirmation; checking reads no sheet"""
+        if not LIVE_UPDATE_SECONDS:
+            return
+        loader, version = self.service.loader, self.data_version
+
+        @st.fragment(run_every=LIVE_UPDATE_SECONDS)
+        def watch():
+            # Hold still while "confirm all matching" is armed, so the set it
+            # confirms is the one the admin acknowledged
+            if loader.version != version and not st.session_state.get('confirm_all_ack'):
+                st.rerun()
+        watch()
+    
     def build_footer(self):
         st.divider()
-        st.caption(f"DCLM Registration Dashboard v1.0 | Data updated at: {datetime.now().strftime('%Y-%m-%d %H:%M')}")
+        synced_at = self.service.loader.synced_at
+        updated = datetime.fromtimestamp(synced_at) if synced_at else datetime.now()
+        st.caption(f"DCLM Registration Dashboard v1.0 | Data updated at: {updated.strftime('%Y-%m-%d %H:%M')}")
     
     def run(self):
-        self.build_metrics()
-        self.build_filters()
-        self.display_results()
-        self.confirmation_section()
-        self.build_footer()
+        sections = [
+            ('metrics', self.build_metrics),
+            ('activity', self.activity_section),
+            ('filters', self.build_filters),
+            ('results', self.display_results),
+            ('confirmation', self.confirmation_section),
+            ('duplicates', self.duplicates_section),
+            ('maintenance', self.maintenance_section),
+            ('footer', self.build_footer),
+            ('live', self.live_updates),
+        ]
+        for name, build in sections:
+            with metrics.timed('dashboard_section_seconds', section=name):
+                build()
 
 # Run the application
 if __name__ == "__main__":
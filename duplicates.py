@@ -0,0 +1,203 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from itertools import combinations
+import numpy as np
+import pandas as pd
+from rapidfuzz import process, fuzz
+from aggregates import MERGED
+from rowids import ID_COLUMN
+
+# Local file recording candidate pairs an admin dismissed as different people
+DISMISSALS_PATH = os.getenv("DUPLICATE_DISMISSALS", "duplicate_dismissals.db")
+
+# Name similarity (token_sort_ratio) a pair needs within each kind of block.
+# A shared phone number is strong evidence by itself, so names may differ more.
+CUTOFFS = {'division': 88, 'contact': 60, 'phonetic': 85}
+
+# Trailing contact digits compared, so a mistyped network prefix still matches
+CONTACT_SUFFIX = 7
+
+_SOUNDEX_CODES = str.maketrans('bfpvcgjkqsxzdtlmnr', '111122222222334556')
+
+def soundex(word):
+    """Four-character Soundex code of a word ('' if it has no letters)"""
+    word = ''.join(ch for ch in word.lower() if ch.isalpha())
+    if not word:
+        return ''
+    codes = word.translate(_SOUNDEX_CODES)
+    digits = []
+    previous = codes[0]
+    for ch, code in zip(word[1:], codes[1:]):
+        if code.isdigit():
+            if code != previous:
+                digits.append(code)
+            previous = code
+        elif ch not in 'hw':
+            # Vowels separate repeated codes; h and w do not
+            previous = ''
+    return (word[0].upper() + ''.join(digits) + '000')[:4]
+
+def phonetic_key(name):
+    """Soundex codes of a name's words in sorted order, so word order does not matter"""
+    return ' '.join(sorted(filter(None, (soundex(word) for word in name.split()))))
+
+
+class DuplicateFinder:
+    """Candidate duplicate participants found by blocked fuzzy name matching
+
+    Rows are grouped into blocks by division, by the last CONTACT_SUFFIX
+    digits of their contact and by region plus the phonetic key of their
+    name. Names are scored with one ``cdist`` call per block, and only
+    within it, instead of against every other participant. Rows are tracked by registration ID:
+    ``update`` compares only IDs it has not seen against the existing
+    members of their blocks. Appended rows are scored that way through
+    ``apply_append``, so a tail refresh costs as much as the new rows; a
+    full reload or an edited name builds a fresh finder.
+    """
+
+    # Structures cached on the loader survive patches to other columns
+    columns = ('Name', 'Contact', 'Region', 'Division', ID_COLUMN)
+
+    def __init__(self):
+        self.seen = set()
+        # Block kind -> block key -> ([registration IDs], [normalized names])
+        self.blocks = {kind: {} for kind in CUTOFFS}
+        # (ID, ID) in sorted order -> (best score, block kind it came from)
+        self.pairs = {}
+        self._lock = threading.Lock()
+
+    def update(self, df):
+        """Score rows with new registration IDs; returns self"""
+        with self._lock:
+            ids = df[ID_COLUMN].astype(str)
+            # Set lookups; isin would copy the whole set on every refresh
+            seen = np.fromiter((row_id in self.seen for row_id in ids.tolist()), dtype=bool, count=len(ids))
+            new = df[(ids != '') & ~seen & ~ids.duplicated()]
+            if new.empty:
+                return self
+
+            new_ids = new[ID_COLUMN].astype(str).tolist()
+            names = new['Name'].astype(str).str.lower().str.split().str.join(' ')
+            contacts = new['Contact'].astype(str).str.replace(r'\D', '', regex=True)
+            # Names repeat a lot; encode each distinct one once
+            phonetic = names.map({name: phonetic_key(name) for name in names.unique()})
+            keys = {
+                'division': new['Division'].astype(str).str.strip().str.lower(),
+                'contact': contacts.str[-CONTACT_SUFFIX:].where(contacts.str.len() >= CONTACT_SUFFIX, ''),
+                # Common names recur across the country, so sound-alikes are
+                # only compared within a region
+                'phonetic': (new['Region'].astype(str) + '|' + phonetic).where(phonetic != '', ''),
+            }
+            name_list = names.tolist()
+            for kind, values in keys.items():
+                # Positional index, so groups map straight into the lists above
+                values = pd.Series(values.to_numpy(dtype=object))
+                values = values[values != '']
+                postings = self.blocks[kind]
+                # Rows alone in their block have nothing to be compared with yet
+                shared = values.map(postings.__contains__).astype(bool) | values.duplicated(keep=False)
+                for key, positions in values[shared].groupby(values[shared]).groups.items():
+                    self._score(kind, postings.setdefault(key, ([], [])),
+                                [new_ids[pos] for pos in positions], [name_list[pos] for pos in positions])
+                for pos, key in values[~shared].items():
+                    postings[key] = ([new_ids[pos]], [name_list[pos]])
+            self.seen.update(new_ids)
+            return self
+
+    def apply_append(self, df, rows):
+        self.update(rows)
+        return True
+
+    def _score(self, kind, block, group_ids, group_names):
+        ids, names = block
+        choice_ids = ids + group_ids
+        cutoff = CUTOFFS[kind]
+        # Starting worker threads only pays off for large blocks
+        workers = -1 if len(group_names) * len(choice_ids) >= 10_000 else 1
+        scores = process.cdist(group_names, names + group_names, scorer=fuzz.token_sort_ratio,
+                               score_cutoff=cutoff, workers=workers)
+        offset = len(ids)
+        for i, j in zip(*np.nonzero(scores >= cutoff)):
+            # New rows are compared with each other once, and never with themselves
+            if j >= offset + i:
+                continue
+            a, b = sorted((group_ids[i], choice_ids[j]))
+            score = float(scores[i, j])
+            if score > self.pairs.get((a, b), (0, None))[0]:
+                self.pairs[(a, b)] = (score, kind)
+        ids.extend(group_ids)
+        names.extend(group_names)
+
+    def clusters(self, df, dismissed=()):
+        """Registration IDs linked by candidate pairs, as (IDs, best score) strongest first
+
+        Pairs with a row merged away, no longer in ``df`` or ``dismissed``
+        by an admin are left out.
+        """
+        status = df.drop_duplicates(ID_COLUMN).set_index(ID_COLUMN)['Registration Status']
+        active = set(status.index[status != MERGED])
+        with self._lock:
+            pairs = [(pair, score) for pair, (score, _) in self.pairs.items()
+                     if pair[0] in active and pair[1] in active and pair not in dismissed]
+
+        parent = {}
+        def find(node):
+            parent.setdefault(node, node)
+            while parent[node] != node:
+                parent[node] = parent[parent[node]]
+                node = parent[node]
+            return node
+
+        for a, b in (pair for pair, _ in pairs):
+            parent[find(a)] = find(b)
+        groups = {}
+        for (a, _), score in pairs:
+            members, best = groups.get(find(a), (set(), 0))
+            groups[find(a)] = (members, max(best, score))
+        for node in parent:
+            groups[find(node)][0].add(node)
+        return sorted(((sorted(members), score) for members, score in groups.values()),
+                      key=lambda cluster: -cluster[1])
+
+
+class DismissalStore:
+    """Candidate pairs an admin marked as different people, kept in SQLite"""
+
+    def __init__(self, path=DISMISSALS_PATH):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS dismissed_pairs (
+                    first_id TEXT NOT NULL,
+                    second_id TEXT NOT NULL,
+                    dismissed_at TEXT NOT NULL,
+                    PRIMARY KEY (first_id, second_id)
+                )
+                """
+            )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def pairs(self):
+        with self._connect() as conn:
+            return set(conn.execute("SELECT first_id, second_id FROM dismissed_pairs").fetchall())
+
+    def dismiss(self, ids):
+        """Dismiss every pair among a cluster's registration IDs"""
+        now = datetime.now().isoformat()
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO dismissed_pairs (first_id, second_id, dismissed_at) VALUES (?, ?, ?)",
+                [(a, b, now) for a, b in combinations(sorted(ids), 2)]
+            )
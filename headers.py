@@ -0,0 +1,44 @@
+import re
+
+# Enhanced column mapping with fuzzy matching
+COLUMN_MAPPING = {
+    'Regstatus': 'Registration Status',
+    'Reg Status': 'Registration Status',
+    'Status': 'Registration Status',
+    'Confirmationstatus': 'Registration Status',
+    'Confirmstatus': 'Registration Status',
+    'Confirmtime': 'Confirmation Time',
+    'Confirm Time': 'Confirmation Time',
+    'Confirmdate': 'Confirmation Time',
+    'Contactinfo': 'Contact',
+    'Contact Info': 'Contact',
+    'Phone': 'Contact',
+    'Mobile': 'Contact',
+    'Phonenumber': 'Contact',
+    'Phone Number': 'Contact',
+    'Telephone': 'Contact',
+    'Telephone Number': 'Contact',
+    'Full Name': 'Name',
+    'Designation': 'Designation Level',
+    'Designationlevel': 'Designation Level',
+    'Pos': 'Position',
+    'Post': 'Position',
+    'Div': 'Division',
+    'Dept': 'Division',
+    'Gender': 'Gender',
+    'Sex': 'Gender',
+    'Registration Id': 'Registration ID',
+    'Registrationid': 'Registration ID',
+    'Reg Id': 'Registration ID'
+}
+
+def normalize_col_name(col):
+    col = str(col).strip()
+    col = re.sub(r'[^a-zA-Z0-9\s]', ' ', col)  # Replace special chars with space
+    col = re.sub(r'\s+', ' ', col)  # Collapse multiple spaces
+    return col.title().strip()
+
+def canonical_headers(headers):
+    """Map raw worksheet headers to the column names used in the DataFrame"""
+    normalized = [normalize_col_name(h) for h in headers]
+    return [COLUMN_MAPPING.get(h, h) for h in normalized]
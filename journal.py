@@ -0,0 +1,250 @@
+import json
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from gspread.utils import rowcol_to_a1
+from changefeed import RowsAppended, feed
+from headers import canonical_headers
+from metrics import error_reason, metrics
+from rowids import ID_COLUMN
+from scheduler import REGISTRATION, priority
+from storage import appended_row
+
+# Local journal file for registrations waiting to reach Google Sheets
+JOURNAL_PATH = os.getenv("REGISTRATION_JOURNAL", "registrations.db")
+
+
+class RegistrationJournal:
+    """Append-only SQLite journal of submitted registration rows"""
+
+    def __init__(self, path=JOURNAL_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS registrations (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    created_at TEXT NOT NULL,
+                    row_json TEXT NOT NULL,
+                    delivered_at TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    last_error TEXT,
+                    worksheet TEXT
+                )
+                """
+            )
+            # Journals from before sharding have no worksheet column; their rows
+            # go to the default worksheet
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(registrations)")}
+            if "worksheet" not in columns:
+                conn.execute("ALTER TABLE registrations ADD COLUMN worksheet TEXT")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_pending ON registrations (delivered_at, id)"
+            )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def append(self, row_values, worksheet=None):
+        """Durably record a row before it is sent to ``worksheet`` (None for the default)"""
+        with self._lock, self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT INTO registrations (created_at, row_json, worksheet) VALUES (?, ?, ?)",
+                (datetime.now().isoformat(), json.dumps(row_values), worksheet)
+            )
+            return cursor.lastrowid
+
+    def append_many(self, rows, worksheet=None):
+        """Durably record several rows for ``worksheet`` in one transaction"""
+        created_at = datetime.now().isoformat()
+        with self._lock, self._connect() as conn:
+            conn.executemany(
+                "INSERT INTO registrations (created_at, row_json, worksheet) VALUES (?, ?, ?)",
+                [(created_at, json.dumps(row_values), worksheet) for row_values in rows]
+            )
+
+    def pending(self, limit=None):
+        """Oldest undelivered rows as (id, values, worksheet title or None, attempts); all if no ``limit``"""
+        with self._lock, self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, row_json, worksheet, attempts FROM registrations "
+                "WHERE delivered_at IS NULL ORDER BY id LIMIT ?",
+                (-1 if limit is None else limit,)
+            ).fetchall()
+        return [(row_id, json.loads(row_json), worksheet, attempts)
+                for row_id, row_json, worksheet, attempts in rows]
+
+    def pending_count(self):
+        with self._lock, self._connect() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM registrations WHERE delivered_at IS NULL"
+            ).fetchone()[0]
+
+    def mark_delivered(self, ids):
+        with self._lock, self._connect() as conn:
+            conn.executemany(
+                "UPDATE registrations SET delivered_at = ? WHERE id = ?",
+                [(datetime.now().isoformat(), row_id) for row_id in ids]
+            )
+
+    def mark_failed(self, ids, error):
+        with self._lock, self._connect() as conn:
+            conn.executemany(
+                "UPDATE registrations SET attempts = attempts + 1, last_error = ? WHERE id = ?",
+                [(str(error), row_id) for row_id in ids]
+            )
+
+
+class RegistrationQueue:
+    """Write-behind queue that flushes journaled registrations to the sheet in batches
+
+    Submissions return as soon as the row is in the local journal. A background
+    thread appends pending rows with one multi-row request per batch and
+    worksheet, and only marks them delivered once the sheet has accepted the
+    write; delivered rows are then published on the change feed.
+    ``open_worksheet(title)`` returns the storage for a title; rows
+    submitted without one go to ``default_worksheet``.
+    """
+
+    def __init__(self, open_worksheet, journal=None, batch_size=500,
+                 flush_interval=2.0, base_delay=1.0, max_delay=60.0,
+                 default_worksheet="national_wk"):
+        self.open_worksheet = open_worksheet
+        self.default_worksheet = default_worksheet
+        self.journal = journal or RegistrationJournal()
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._worksheets = {}
+        self._failures = 0
+        # The flusher thread and explicit flush() calls must not send the same batch
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="registration-flusher", daemon=True)
+        self._thread.start()
+
+    def submit(self, row_values, worksheet=None):
+        """Accept a registration immediately; it is written to the sheet in the background"""
+        row_id = self.journal.append(row_values, worksheet)
+        self._wake.set()
+        return row_id
+
+    def submit_many(self, rows, worksheet=None):
+        """Accept a list of rows at once; they reach the sheet in batches of ``batch_size``"""
+        self.journal.append_many(rows, worksheet)
+        self._wake.set()
+
+    def pending_count(self):
+        return self.journal.pending_count()
+
+    def _backoff(self):
+        # Exponential backoff with full jitter
+        delay = min(self.max_delay, self.base_delay * (2 ** min(self._failures, 16)))
+        return random.uniform(0, delay)
+
+    def flush(self):
+        """Send every pending row to its sheet; returns the number delivered"""
+        with self._flush_lock:
+            return self._flush()
+
+    def _flush(self):
+        delivered = 0
+        while True:
+            batch = self.journal.pending(self.batch_size)
+            if not batch:
+                return delivered
+
+            # One append per worksheet, oldest worksheet first
+            groups = {}
+            for row_id, values, title, attempts in batch:
+                groups.setdefault(title or self.default_worksheet, []).append((row_id, values, attempts))
+
+            failed = False
+            for title, rows in groups.items():
+                ids = [row_id for row_id, _, _ in rows]
+                try:
+                    if title not in self._worksheets:
+                        self._worksheets[title] = self.open_worksheet(title)
+                    worksheet = self._worksheets[title]
+                    # Never append while a repair is clearing and rewriting the sheet;
+                    # confirmations only touch existing rows, so appends do not wait
+                    # for them. Registrations go ahead of every other call waiting for quota.
+                    with worksheet.repair_lock, priority(REGISTRATION):
+                        if any(attempts for _, _, attempts in rows):
+                            landed = self._already_appended(worksheet, rows)
+                            if landed:
+                                self.journal.mark_delivered(sorted(landed))
+                                delivered += len(landed)
+                                metrics.inc("registration_flush_resends_skipped_total", len(landed))
+                                rows = [row for row in rows if row[0] not in landed]
+                                ids = [row_id for row_id, _, _ in rows]
+                        response = worksheet.append_rows([values for _, values, _ in rows]) if rows else None
+                except Exception as e:
+                    self.journal.mark_failed(ids, e)
+                    metrics.inc("registration_flush_retries_total", reason=error_reason(e))
+                    # Reconnect on the next attempt in case the handle went stale
+                    self._worksheets.pop(title, None)
+                    failed = True
+                    continue
+
+                if not rows:
+                    continue
+                self.journal.mark_delivered(ids)
+                delivered += len(ids)
+                # Dashboards in this process pick the rows up without reading the sheet
+                feed.publish(RowsAppended(title, appended_row(response), [values for _, values, _ in rows]))
+
+            if failed:
+                time.sleep(self._backoff())
+                self._failures += 1
+            else:
+                self._failures = 0
+
+    def _already_appended(self, worksheet, rows):
+        """Journal ids of ``rows`` whose registration ID is already in the sheet
+
+        An append that failed on our side (e.g. a timeout) may still have
+        reached the sheet, so rows are checked before they are sent again.
+        Rows are journaled in the sheet's column order.
+        """
+        headers = canonical_headers(worksheet.row_values(1))
+        if ID_COLUMN not in headers:
+            return set()
+        col = headers.index(ID_COLUMN)
+        letter = re.sub(r'\d', '', rowcol_to_a1(1, col + 1))
+        present = {row[0] for row in worksheet.batch_get([f"{letter}2:{letter}"])[0] if row}
+        return {row_id for row_id, values, _ in rows
+                if len(values) > col and values[col] and values[col] in present}
+
+    def close(self):
+        """Stop the flusher thread; undelivered rows stay in the journal"""
+        self._closed.set()
+        self._wake.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._closed.is_set():
+            self._wake.wait(timeout=self.flush_interval)
+            self._wake.clear()
+            if self._closed.is_set():
+                return
+            try:
+                self.flush()
+            except Exception:
+                # Journal errors must not kill the flusher; try again next cycle
+                time.sleep(self._backoff())
@@ -0,0 +1,562 @@
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from gspread.utils import rowcol_to_a1
+from cleaning import canonical_headers, clean_rows, concat_frames, set_values
+from metrics import metrics
+from snapshot import load_snapshot, save_snapshot
+from scheduler import current_priority, priority
+from shards import shard_offset, split_label
+from writeback import VERSION_COLUMN, read_rows
+
+def _trim(row):
+    # The Sheets API drops trailing empty cells, so compare rows without them
+    row = list(row)
+    while row and row[-1] == '':
+        row.pop()
+    return row
+
+class FrameCache:
+    """A shared frame plus structures derived from it, cached per version
+
+    ``version`` is bumped whenever the frame changes. ``base_version`` is
+    the last version that changed more than rows appended at the end, so
+    a newer frame holds the same rows plus some. Subclasses fill ``df``
+    and implement ``load``.
+    """
+
+    def __init__(self):
+        self.df = None
+        self.version = 0
+        self.base_version = 0
+        self._derived = {}
+        self._lock = threading.RLock()
+
+    def load(self):
+        raise NotImplementedError
+
+    def derived(self, key, build):
+        """Structure built from the current frame, cached per data version
+
+        A structure with a ``columns`` attribute survives patches that do not
+        touch those columns; one with ``apply_changes`` may update itself in
+        place, and one with ``apply_append`` takes appended rows in place.
+        Anything else is rebuilt after every change.
+        """
+        with self._lock:
+            if self.df is None:
+                self.load()
+            cached = self._derived.get(key)
+            hit = cached is not None and cached[0] == self.version
+            metrics.inc("cache_requests_total", cache=key, result="hit" if hit else "miss")
+            if not hit:
+                cached = (self.version, build(self.df))
+                self._derived[key] = cached
+            return cached[1]
+
+    def _apply_patch(self, changes):
+        """Set changed cells in the frame and carry derived structures over
+
+        Returns the changes that applied to rows in the frame. Call with the
+        lock held.
+        """
+        if self.df is None:
+            return {}
+        # Read and write one column at a time for every row that changes it
+        by_column = {}
+        for idx, cols in changes.items():
+            if idx in self.df.index:
+                for col, value in cols.items():
+                    by_column.setdefault(col, {})[idx] = value
+        before = {}
+        for col, values in by_column.items():
+            for idx, value in zip(values, self.df.loc[list(values), col].tolist()):
+                before.setdefault(idx, {})[col] = value
+        # Cells that already hold the value (e.g. a write this process patched
+        # in before the change feed delivered it) are not changes
+        changes = {}
+        for col, values in by_column.items():
+            values = {idx: value for idx, value in values.items() if str(before[idx][col]) != str(value)}
+            if values:
+                set_values(self.df, list(values), col, list(values.values()))
+            for idx, value in values.items():
+                changes.setdefault(idx, {})[col] = value
+        if not changes:
+            return {}
+
+        changed = {col for cols in changes.values() for col in cols}
+        previous, self.version = self.version, self.version + 1
+        self.base_version = self.version
+        for key, (version, obj) in list(self._derived.items()):
+            depends = getattr(obj, 'columns', None)
+            apply_changes = getattr(obj, 'apply_changes', None)
+            if version != previous:
+                del self._derived[key]
+            elif depends is not None and not changed & set(depends):
+                self._derived[key] = (self.version, obj)
+            elif apply_changes is not None and apply_changes(self.df, changes, before):
+                self._derived[key] = (self.version, obj)
+            else:
+                del self._derived[key]
+        return changes
+
+    def _apply_append(self, rows):
+        """Append cleaned ``rows`` to the frame and carry derived structures over
+
+        Call with the lock held.
+        """
+        self.df = concat_frames([self.df, rows])
+        previous, self.version = self.version, self.version + 1
+        for key, (version, obj) in list(self._derived.items()):
+            apply_append = getattr(obj, 'apply_append', None)
+            if version == previous and apply_append is not None and apply_append(self.df, rows):
+                self._derived[key] = (self.version, obj)
+            else:
+                del self._derived[key]
+
+class IncrementalLoader(FrameCache):
+    """Cleaned copy of a worksheet that is extended by fetching only appended rows
+
+    A refresh reads the header row, the first and last rows already loaded,
+    the Row Version column of the loaded rows and everything below the last
+    loaded row in one ``batch_get``. Only the new rows are cleaned and
+    appended to the cached frame. Every write bumps a row's version, so rows
+    whose version moved on are re-read and patched in; more than
+    ``reread_limit`` of them fall back to a full reload. So does a changed
+    header or probe row (a deletion or insertion), and ``full_reload_every``
+    seconds passing, which also picks up hand edits that left the version
+    alone.
+
+    With a ``snapshot_path`` the cleaned frame is also kept in a local Arrow
+    file. A cold start serves the snapshot at once, and once a frame is
+    loaded, stale reads return it immediately while a background thread
+    reconciles with the sheet, so a slow or unreachable sheet never blocks
+    the dashboard. ``prepare`` runs once before the first sheet read (in
+    whichever thread does it) until it succeeds.
+    """
+
+    def __init__(self, worksheet, ttl=60, full_reload_every=600, snapshot_path=None, prepare=None,
+                 reread_limit=500):
+        super().__init__()
+        self.worksheet = worksheet
+        self.ttl = ttl
+        self.full_reload_every = full_reload_every
+        self.reread_limit = reread_limit
+        self.snapshot_path = snapshot_path
+        self.prepare = prepare
+        self.headers = []
+        self.row_count = 0
+        self.first_row = []
+        self.last_row = []
+        self.loaded_at = 0.0
+        self.full_loaded_at = 0.0
+        self._prepared = prepare is None
+        self._snapshot_checked = False
+        self._refresher = None
+        self._saver = None
+        self._saved_version = None
+        # Wall time the frame last matched the sheet, whether it is still the
+        # snapshot from before a restart, and the last background refresh error
+        self.synced_at = None
+        self.from_snapshot = False
+        self.last_error = None
+
+    def invalidate(self):
+        """Force a full reload on the next call to load()"""
+        with self._lock:
+            self.df = None
+
+    @property
+    def refreshing(self):
+        return self._refresher is not None and self._refresher.is_alive()
+
+    def load(self):
+        with self._lock:
+            if self.df is None and self.snapshot_path and not self._snapshot_checked:
+                self._snapshot_checked = True
+                if self._adopt_snapshot():
+                    metrics.inc("cache_requests_total", cache="loader", result="snapshot")
+                    self._start_refresh()
+                    return self.df
+
+            if self.df is not None and time.monotonic() - self.loaded_at < self.ttl:
+                metrics.inc("cache_requests_total", cache="loader", result="hit")
+                return self.df
+
+            if self.df is not None and self.snapshot_path:
+                # Serve what we have; the sheet is reconciled in the background
+                metrics.inc("cache_requests_total", cache="loader", result="stale")
+                self._start_refresh()
+                return self.df
+
+            # Holding the lock makes concurrent sessions wait for this fetch
+            # instead of starting their own
+            result = self._refresh()
+            metrics.inc("cache_requests_total", cache="loader", result=result)
+            return self.df
+
+    def _refresh(self):
+        """Bring the frame up to date with the sheet; returns 'tail', 'full' or 'skipped'
+
+        Sheet reads happen without the lock unless the caller holds it. If
+        the frame was patched meanwhile, the fetched rows may predate that
+        write, so they are dropped and the next load tries again.
+        """
+        if not self._prepared:
+            self.prepare()
+            self._prepared = True
+
+        with self._lock:
+            version = self.version
+            full = self.df is None or time.monotonic() - self.full_loaded_at >= self.full_reload_every
+            ranges = None if full else self._tail_ranges()
+
+        if ranges is not None:
+            results = self.worksheet.batch_get(ranges)
+            with self._lock:
+                if self.version != version:
+                    return "skipped"
+                edited = self._edited_rows(results[4]) if len(results) > 4 else []
+            if edited is not None:
+                # Rows another writer changed since they were loaded
+                current = read_rows(self.worksheet, self.headers, [label + 2 for label in edited]) if edited else None
+                with self._lock:
+                    if self.version != version:
+                        return "skipped"
+                    if self._apply_tail(results[:4]):
+                        if current is not None:
+                            self._apply_edits(current)
+                        self._synced()
+                        self._save_snapshot_later()
+                        return "tail"
+
+        values = self.worksheet.get_all_values()
+        with self._lock:
+            if self.df is not None and self.version != version:
+                return "skipped"
+            self._apply_full(values)
+            self._synced()
+            self._save_snapshot_later()
+            return "full"
+
+    def _synced(self):
+        self.loaded_at = time.monotonic()
+        self.synced_at = time.time()
+        self.from_snapshot = False
+
+    def _start_refresh(self):
+        if self.refreshing:
+            return
+        self._refresher = threading.Thread(target=self._background_refresh, name="loader-refresh", daemon=True)
+        self._refresher.start()
+
+    def _background_refresh(self):
+        try:
+            result = self._refresh()
+        except Exception as e:
+            # Keep serving the frame we have and try again after the ttl
+            with self._lock:
+                self.last_error = e
+                self.loaded_at = time.monotonic()
+            metrics.inc("loader_refresh_errors_total")
+            return
+        with self._lock:
+            self.last_error = None
+        metrics.inc("cache_requests_total", cache="loader", result=result)
+
+    def _adopt_snapshot(self):
+        loaded = load_snapshot(self.snapshot_path)
+        if loaded is None:
+            return False
+        self.df, state = loaded
+        self.headers = state['headers']
+        self.row_count = state['row_count']
+        self.first_row = state['first_row']
+        self.last_row = state['last_row']
+        self.synced_at = state['synced_at']
+        self.from_snapshot = True
+        # Stale from the start, with a full reload due, so the first refresh
+        # also picks up edits made while the app was down
+        self.loaded_at = self.full_loaded_at = float('-inf')
+        self.version += 1
+        self.base_version = self.version
+        self._saved_version = self.version
+        return True
+
+    def _save_snapshot_later(self):
+        """Write the current frame to the snapshot from a background thread (call with the lock held)"""
+        if not self.snapshot_path or (self._saver is not None and self._saver.is_alive()):
+            return
+        self._saver = threading.Thread(target=self._save_snapshots, name="snapshot-writer", daemon=True)
+        self._saver.start()
+
+    def _save_snapshots(self):
+        # Keep going until the snapshot has caught up with the frame
+        while True:
+            with self._lock:
+                if self.df is None or self._saved_version == self.version:
+                    self._saver = None
+                    return
+                version = self.version
+                df = self.df.copy()
+                state = {'headers': self.headers, 'row_count': self.row_count,
+                         'first_row': self.first_row, 'last_row': self.last_row,
+                         'synced_at': self.synced_at}
+            try:
+                save_snapshot(self.snapshot_path, df, state)
+            except OSError:
+                metrics.inc("snapshot_write_errors_total")
+                with self._lock:
+                    self._saver = None
+                return
+            self._saved_version = version
+
+    def patch(self, changes):
+        """Apply cell changes this process has written to the sheet
+
+        ``changes`` maps row index to {column: value}. The cached frame is
+        updated in place and the version bumped, so no session has to reload
+        the sheet. Derived structures are carried over to the new version
+        unless they depend on a changed column and cannot follow the change.
+        """
+        with self._lock:
+            changes = self._apply_patch(changes)
+            if not changes:
+                return
+
+            # Keep the probe rows in step so the next tail fetch does not see an edit
+            columns = canonical_headers(self.headers)
+            for idx, probe in ((0, 'first_row'), (self.row_count - 1, 'last_row')):
+                if idx in changes:
+                    row = getattr(self, probe) + [''] * (len(columns) - len(getattr(self, probe)))
+                    for col, value in changes[idx].items():
+                        if col in columns:
+                            row[columns.index(col)] = str(value)
+                    setattr(self, probe, _trim(row))
+            self._save_snapshot_later()
+
+    def extend(self, first_row, rows):
+        """Append rows this process has just added to the sheet, without reading it
+
+        Only rows that landed at ``first_row`` right below the loaded ones
+        are taken; anything else (another writer appended first, or the
+        sheet did not say where they went) is left to the next refresh.
+        Returns the cleaned new rows, or None if they were not taken.
+        """
+        with self._lock:
+            if self.df is None or not rows or first_row != self.row_count + 2:
+                return None
+            # As the sheet would return them
+            rows = [['' if value is None else str(value) for value in row] for row in rows]
+            new_rows = clean_rows(self.headers, rows, start=self.row_count)
+            self.row_count += len(rows)
+            self.last_row = _trim(rows[-1])
+            if not self.first_row:
+                self.first_row = _trim(rows[0])
+            self._apply_append(new_rows)
+            self._save_snapshot_later()
+            return new_rows
+
+    def _remember(self, headers, rows):
+        self.headers = list(headers)
+        self.row_count = len(rows)
+        self.first_row = _trim(rows[0]) if rows else []
+        self.last_row = _trim(rows[-1]) if rows else []
+
+    def _apply_full(self, values):
+        headers, rows = (values[0], values[1:]) if values else ([], [])
+        self.df = clean_rows(headers, rows)
+        self._remember(headers, rows)
+        self.full_loaded_at = time.monotonic()
+        self.version += 1
+        self.base_version = self.version
+
+    def _tail_ranges(self):
+        """Header row, the two probe rows, everything below the last loaded row and
+        the loaded rows' Row Version column (if the sheet has one)"""
+        last_col = re.sub(r'\d', '', rowcol_to_a1(1, max(len(self.headers), 1)))
+        first_new = self.row_count + 2
+        ranges = ['1:1', '2:2', f'{first_new - 1}:{first_new - 1}', f'A{first_new}:{last_col}']
+        columns = canonical_headers(self.headers)
+        if self.row_count and VERSION_COLUMN in columns:
+            version_col = re.sub(r'\d', '', rowcol_to_a1(1, columns.index(VERSION_COLUMN) + 1))
+            ranges.append(f'{version_col}2:{version_col}{first_new - 1}')
+        return ranges
+
+    def _edited_rows(self, versions):
+        """Labels of loaded rows whose Row Version differs from the sheet's
+
+        Returns None when there are more than ``reread_limit``, so a full
+        reload is cheaper. Call with the lock held.
+        """
+        # The Sheets API drops trailing empty cells and rows
+        sheet = [row[0] if row else '' for row in versions]
+        sheet += [''] * (self.row_count - len(sheet))
+        loaded = self.df[VERSION_COLUMN].astype(str).tolist()
+        edited = [label for label, theirs, ours in zip(self.df.index, sheet, loaded) if theirs != ours]
+        return None if len(edited) > self.reread_limit else edited
+
+    def _apply_edits(self, current):
+        """Patch re-read rows into the frame (call with the lock held)"""
+        columns = [col for col in current.columns if col in self.df.columns]
+        self.patch({label: dict(zip(columns, values))
+                    for label, values in zip(current.index, current[columns].itertuples(index=False))})
+
+    def _apply_tail(self, results):
+        """Append newly added rows; returns False when a full reload is needed"""
+        header, first, last, tail = results
+
+        # Header changes, deleted rows or edits to the probe rows invalidate the cache
+        if _trim(header[0] if header else []) != _trim(self.headers):
+            return False
+        if self.row_count:
+            if _trim(first[0] if first else []) != self.first_row:
+                return False
+            if _trim(last[0] if last else []) != self.last_row:
+                return False
+
+        tail = list(tail)
+        if tail:
+            new_rows = clean_rows(self.headers, tail, start=self.row_count)
+            self.row_count += len(tail)
+            self.last_row = _trim(tail[-1])
+            if not self.first_row:
+                self.first_row = _trim(tail[0])
+            # Derived structures take the new rows instead of being rebuilt
+            self._apply_append(new_rows)
+        return True
+
+class ShardedLoader(FrameCache):
+    """One frame merged from an IncrementalLoader per region worksheet
+
+    Shards are refreshed concurrently on a thread pool and re-merged only
+    when one of them changed. ``load(regions=[...])`` refreshes just those
+    shards and serves the others from their caches, so a region-filtered
+    view reads one worksheet. Merged row labels are offset per region (see
+    shards.SHARD_STRIDE), so each label still maps to one row in one shard.
+    """
+
+    def __init__(self, worksheets, ttl=60, full_reload_every=600, snapshot_path=None,
+                 prepare=None, max_workers=8):
+        super().__init__()
+        # Each shard keeps its own snapshot file and prepares its own worksheet
+        self.shards = {
+            region: IncrementalLoader(
+                worksheet, ttl, full_reload_every,
+                snapshot_path=f"{snapshot_path}.{region}" if snapshot_path else None,
+                prepare=(lambda worksheet=worksheet: prepare(worksheet)) if prepare else None,
+            )
+            for region, worksheet in worksheets.items()
+        }
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="shard-fetch")
+        # Shard versions and row counts the merged frame was built from
+        self._merged = {}
+        self._merged_rows = {}
+
+    @property
+    def synced_at(self):
+        times = [shard.synced_at for shard in self.shards.values()]
+        return None if None in times else min(times, default=None)
+
+    @property
+    def from_snapshot(self):
+        return any(shard.from_snapshot for shard in self.shards.values())
+
+    @property
+    def last_error(self):
+        return next((shard.last_error for shard in self.shards.values() if shard.last_error is not None), None)
+
+    @property
+    def refreshing(self):
+        return any(shard.refreshing for shard in self.shards.values())
+
+    def invalidate(self):
+        with self._lock:
+            for shard in self.shards.values():
+                shard.invalidate()
+            self.df = None
+
+    def load(self, regions=None):
+        with self._lock:
+            if self.df is None or regions is None:
+                regions = list(self.shards)
+            level, _ = current_priority()
+
+            def load_shard(region):
+                # Pool threads do not inherit the caller's priority
+                with priority(level):
+                    return self.shards[region].load()
+
+            # Shards are fetched in parallel; the first failure is raised here
+            list(self._pool.map(load_shard, [r for r in regions if r in self.shards]))
+
+            changed = [region for region, shard in self.shards.items()
+                       if self._merged.get(region) != shard.version]
+            if self.df is None:
+                self._merge()
+            elif changed and all(self._grew(region) for region in changed):
+                # New rows at the end of shards (a tail refresh) are appended,
+                # so derived structures take them instead of being rebuilt
+                for region in changed:
+                    self._append_tail(region)
+            elif changed:
+                self._merge()
+            return self.df
+
+    def _grew(self, region):
+        """Whether ``region``'s shard only has rows appended since the merge"""
+        shard = self.shards[region]
+        return shard.df is not None and region in self._merged and shard.base_version <= self._merged[region]
+
+    def _append_tail(self, region):
+        shard = self.shards[region]
+        rows = shard.df.iloc[self._merged_rows[region]:]
+        self._merged[region] = shard.version
+        self._merged_rows[region] = len(shard.df)
+        if len(rows):
+            self._apply_append(rows.set_axis(rows.index + shard_offset(region)))
+
+    def _merge(self):
+        frames = []
+        for region, shard in self.shards.items():
+            if shard.df is None:
+                continue
+            frames.append(shard.df.set_axis(shard.df.index + shard_offset(region)))
+        self.df = concat_frames(frames)
+        self._merged = {region: shard.version for region, shard in self.shards.items()}
+        self._merged_rows = {region: len(shard.df) for region, shard in self.shards.items()
+                             if shard.df is not None}
+        self.version += 1
+        self.base_version = self.version
+
+    def patch(self, changes):
+        """Apply written changes to the shards and to the merged frame in place"""
+        with self._lock:
+            by_shard = {}
+            for label, cols in changes.items():
+                region, local = split_label(label)
+                by_shard.setdefault(region, {})[local] = cols
+            for region, local_changes in by_shard.items():
+                shard = self.shards[region]
+                in_step = self._merged.get(region) == shard.version
+                shard.patch(local_changes)
+                if in_step:
+                    # The merged frame gets the same change below; no re-merge needed
+                    self._merged[region] = shard.version
+            self._apply_patch(changes)
+
+    def extend(self, region, first_row, rows):
+        """Append rows just added to ``region``'s worksheet to its shard and to the merged frame"""
+        with self._lock:
+            shard = self.shards.get(region)
+            if shard is None:
+                return None
+            in_step = self.df is not None and self._merged.get(region) == shard.version
+            new_rows = shard.extend(first_row, rows)
+            if new_rows is not None and in_step:
+                # Appended in place; no re-merge needed
+                self._merged[region] = shard.version
+                self._merged_rows[region] = len(shard.df)
+                self._apply_append(new_rows.set_axis(new_rows.index + shard_offset(region)))
+            return new_rows
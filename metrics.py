@@ -0,0 +1,159 @@
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Prometheus text file written by the exporter thread, and how often
+METRICS_FILE = os.getenv("METRICS_FILE", "metrics.prom")
+METRICS_INTERVAL = float(os.getenv("METRICS_INTERVAL", "15"))
+
+HELP = {
+    "sheets_calls_total": "Worksheet API calls by method and kind",
+    "sheets_errors_total": "Worksheet API calls that raised, by method and error",
+    "sheets_call_seconds": "Time spent in worksheet API calls",
+    "sheets_calls_last_minute": "Worksheet API calls in the last 60 seconds, by kind",
+    "sheets_queue_wait_seconds": "Time worksheet calls waited for quota, by kind and priority",
+    "registration_flush_retries_total": "Failed registration flushes that were retried",
+    "registration_duplicates_total": "Registrations refused as duplicates, by reason",
+    "cache_requests_total": "Cache lookups by cache and result",
+    "dashboard_section_seconds": "Render time of dashboard sections per rerun",
+    "change_feed_events_total": "Row writes published on the in-process change feed, by kind",
+    "change_feed_errors_total": "Change feed deliveries a subscriber failed to apply, by kind",
+}
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def error_reason(error):
+    """Label for a failed call: 'quota' for rate limiting, else the exception type"""
+    text = str(error)
+    if "RESOURCE_EXHAUSTED" in text or "[429]" in text:
+        return "quota"
+    return type(error).__name__
+
+
+class Metrics:
+    """Process-wide counters, timing summaries and per-minute call windows"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        # (name, labels) -> [count, sum, max] in seconds
+        self.timings = {}
+        self.windows = {'read': deque(), 'write': deque()}
+        self.started_at = time.time()
+
+    def inc(self, name, amount=1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, seconds, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            summary = self.timings.setdefault(key, [0, 0.0, 0.0])
+            summary[0] += 1
+            summary[1] += seconds
+            summary[2] = max(summary[2], seconds)
+
+    @contextmanager
+    def timed(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def record_call(self, method, kind, seconds, error=None):
+        """Account for one worksheet call; ``kind`` is 'read' or 'write'"""
+        self.inc("sheets_calls_total", method=method, kind=kind)
+        self.observe("sheets_call_seconds", seconds, method=method)
+        if error is not None:
+            self.inc("sheets_errors_total", method=method, error=error_reason(error))
+        now = time.monotonic()
+        with self._lock:
+            self.windows[kind].append(now)
+            self._trim(now)
+
+    def _trim(self, now):
+        for window in self.windows.values():
+            while window and now - window[0] >= 60:
+                window.popleft()
+
+    def calls_last_minute(self):
+        with self._lock:
+            self._trim(time.monotonic())
+            return {kind: len(window) for kind, window in self.windows.items()}
+
+    def snapshot(self):
+        """Copies of the counters and timings, safe to read while calls continue"""
+        with self._lock:
+            counters = dict(self.counters)
+            timings = {key: list(summary) for key, summary in self.timings.items()}
+        return counters, timings
+
+    def render_prometheus(self):
+        """All metrics in the Prometheus text exposition format"""
+        counters, timings = self.snapshot()
+        gauges = {_key("sheets_calls_last_minute", {'kind': kind}): count
+                  for kind, count in self.calls_last_minute().items()}
+
+        def labels_text(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{str(v).replace(chr(34), "")}"' for k, v in pairs) + "}"
+
+        lines = []
+        for kind, series in (("counter", counters), ("gauge", gauges)):
+            for name in sorted({name for name, _ in series}):
+                lines.append(f"# HELP {name} {HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} {kind}")
+                for (series_name, labels), value in sorted(series.items()):
+                    if series_name == name:
+                        lines.append(f"{name}{labels_text(labels)} {value}")
+        for name in sorted({name for name, _ in timings}):
+            lines.append(f"# HELP {name} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} summary")
+            for (series_name, labels), (count, total, peak) in sorted(timings.items()):
+                if series_name == name:
+                    lines.append(f"{name}_count{labels_text(labels)} {count}")
+                    lines.append(f"{name}_sum{labels_text(labels)} {total:.6f}")
+                    lines.append(f"{name}{labels_text(labels, [('quantile', '1')])} {peak:.6f}")
+        return "\n".join(lines) + "\n"
+
+    def write_file(self, path=METRICS_FILE):
+        # Write then rename so a scraper never reads a half-written file
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            f.write(self.render_prometheus())
+        os.replace(tmp, path)
+
+
+metrics = Metrics()
+
+_exporter = None
+_exporter_lock = threading.Lock()
+
+def start_exporter(path=METRICS_FILE, interval=METRICS_INTERVAL):
+    """Start the thread that rewrites the metrics file every ``interval`` seconds, once per process"""
+    global _exporter
+    with _exporter_lock:
+        if _exporter is not None:
+            return _exporter
+
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    metrics.write_file(path)
+                except OSError:
+                    # A full disk or missing directory must not kill the exporter
+                    pass
+
+        _exporter = threading.Thread(target=run, name="metrics-exporter", daemon=True)
+        _exporter.start()
+        return _exporter
@@ -0,0 +1,15 @@
+import math
+import streamlit as st
+from contextlib import contextmanager
+from scheduler import priority
+
+
+@contextmanager
+def sheets_priority(level):
+    """Run worksheet calls at ``level``, showing the queue position while they wait for quota"""
+    notice = st.empty()
+    def on_wait(position, eta):
+        notice.info(f"⏳ Waiting for Sheets quota: position {position} in queue, about {math.ceil(eta)}s")
+    with priority(level, on_wait):
+        yield
+    notice.empty()
@@ -0,0 +1,82 @@
+import re
+import threading
+from headers import canonical_headers
+
+def contact_key(contact):
+    """Digits of a phone number in local form (+233 24... becomes 024...)"""
+    digits = re.sub(r'\D', '', str(contact))
+    if digits.startswith('233') and len(digits) == 12:
+        digits = '0' + digits[3:]
+    return digits
+
+def name_key(name, division):
+    """(name, division) ignoring case and spacing"""
+    return ' '.join(str(name).lower().split()), str(division).strip().lower()
+
+
+class RegistrationRegistry:
+    """Contacts and name+division pairs already registered, for O(1) duplicate checks
+
+    Filled once per process from the worksheets and the journal, then kept
+    up to date by every accepted submission, so checking a registration
+    never reads the sheet. Each form submission carries a token; a retried
+    submission whose token was already accepted is recognised, not re-added.
+    """
+
+    def __init__(self):
+        # Normalized key -> registration ID of the first row with it
+        self.contacts = {}
+        self.names = {}
+        self.tokens = {}
+        self._lock = threading.Lock()
+
+    def add_rows(self, headers, rows):
+        """Record existing sheet ``rows`` laid out under ``headers``"""
+        headers = canonical_headers(headers)
+        positions = [headers.index(col) if col in headers else None
+                     for col in ('Contact', 'Name', 'Division', 'Registration ID')]
+        with self._lock:
+            for row in rows:
+                contact, name, division, registration_id = (
+                    row[pos] if pos is not None and pos < len(row) else '' for pos in positions
+                )
+                self._add(contact_key(contact), name_key(name, division), registration_id)
+
+    def _add(self, contact, name, registration_id):
+        if contact:
+            self.contacts.setdefault(contact, registration_id)
+        if name[0]:
+            self.names.setdefault(name, registration_id)
+
+    def keys(self):
+        """Copies of the registered contact and (name, division) keys"""
+        with self._lock:
+            return set(self.contacts), set(self.names)
+
+    def claim(self, contact, name, division, registration_id, token=None):
+        """Record a new registration unless it is already known
+
+        Returns None if it was recorded, otherwise why not: 'token' when this
+        submission was already accepted, 'contact' or 'name' when someone
+        with that contact, or that name in that division, is registered.
+        """
+        contact, name = contact_key(contact), name_key(name, division)
+        with self._lock:
+            if token is not None and token in self.tokens:
+                return 'token'
+            if contact and contact in self.contacts:
+                return 'contact'
+            if name[0] and name in self.names:
+                return 'name'
+            self._add(contact, name, registration_id)
+            if token is not None:
+                self.tokens[token] = registration_id
+        return None
+
+    def release(self, contact, name, division, token=None):
+        """Forget a claimed registration that could not be submitted"""
+        with self._lock:
+            self.contacts.pop(contact_key(contact), None)
+            self.names.pop(name_key(name, division), None)
+            if token is not None:
+                self.tokens.pop(token, None)
@@ -0,0 +1,74 @@
+import uuid
+from gspread.utils import rowcol_to_a1
+from headers import canonical_headers
+
+ID_COLUMN = 'Registration ID'
+
+def new_registration_id():
+    return uuid.uuid4().hex[:12]
+
+def backfill_registration_ids(worksheet, chunk_size=500):
+    """Give every existing row without a registration ID a new one
+
+    Blank IDs in consecutive rows are written as one range, and ranges are
+    sent in batches of ``chunk_size``. Returns the number of IDs written.
+    """
+    values = worksheet.get_all_values()
+    if not values:
+        return 0
+
+    headers = canonical_headers(values[0])
+    ranges = []
+    if ID_COLUMN in headers:
+        col = headers.index(ID_COLUMN) + 1
+    else:
+        col = len(headers) + 1
+        ranges.append({'range': rowcol_to_a1(1, col), 'values': [[ID_COLUMN]]})
+
+    # Sheet rows (1-based) that hold data but no ID
+    missing = [
+        row_num for row_num, row in enumerate(values[1:], start=2)
+        if any(cell != '' for cell in row) and (len(row) < col or row[col - 1] == '')
+    ]
+
+    run = []
+    for row_num in missing + [None]:
+        if run and row_num != run[-1] + 1:
+            start = rowcol_to_a1(run[0], col)
+            end = rowcol_to_a1(run[-1], col)
+            ranges.append({
+                'range': start if start == end else f"{start}:{end}",
+                'values': [[new_registration_id()] for _ in run]
+            })
+            run = []
+        if row_num is not None:
+            run.append(row_num)
+
+    for i in range(0, len(ranges), chunk_size):
+        worksheet.batch_update(ranges[i:i + chunk_size])
+    return len(missing)
+
+class RowIndex:
+    """Registration ID to DataFrame row, built once per data version
+
+    Row labels come from the loader; with region shards they carry the
+    shard's offset (see shards.split_label).
+    """
+
+    columns = (ID_COLUMN,)
+
+    def __init__(self, df):
+        self.rows = {}
+        self.apply_append(df, df)
+
+    def apply_append(self, df, rows):
+        ids = rows[ID_COLUMN]
+        present = ids != ''
+        self.rows.update(zip(ids[present], rows.index[present]))
+        return True
+
+    def __contains__(self, registration_id):
+        return registration_id in self.rows
+
+    def label(self, registration_id):
+        return self.rows[registration_id]
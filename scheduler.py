@@ -0,0 +1,144 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from metrics import metrics
+
+# Sheets API quotas per minute for this service account (reads and writes
+# are limited separately) and how many calls may go out back to back
+READ_PER_MINUTE = float(os.getenv("SHEETS_READ_PER_MINUTE", "60"))
+WRITE_PER_MINUTE = float(os.getenv("SHEETS_WRITE_PER_MINUTE", "60"))
+BURST = float(os.getenv("SHEETS_BURST", "10"))
+
+# Lower runs first
+REGISTRATION = 0
+CONFIRMATION = 1
+DASHBOARD = 2
+
+PRIORITY_NAMES = {REGISTRATION: 'registration', CONFIRMATION: 'confirmation', DASHBOARD: 'dashboard'}
+
+_context = threading.local()
+
+@contextmanager
+def priority(level, on_wait=None):
+    """Run worksheet calls made by this thread at ``level``
+
+    ``on_wait(position, eta)`` is called while a call waits for quota, with
+    its 1-based place in the queue and the estimated seconds until it runs.
+    Calls made outside any ``priority`` block run as DASHBOARD reads.
+    """
+    previous = getattr(_context, 'current', None)
+    _context.current = (level, on_wait)
+    try:
+        yield
+    finally:
+        _context.current = previous
+
+def current_priority():
+    return getattr(_context, 'current', None) or (DASHBOARD, None)
+
+
+class TokenBucket:
+    """``rate`` tokens per second up to ``capacity``; may go negative after a penalty"""
+
+    def __init__(self, per_minute, capacity):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def eta(self, needed):
+        """Seconds until ``needed`` tokens will have accumulated"""
+        return max(0.0, (needed - self.tokens) / self.rate)
+
+
+class Scheduler:
+    """Process-wide token buckets that order worksheet calls by priority
+
+    Each call takes one token from the bucket for its kind ('read' or
+    'write'). When the bucket is empty, callers queue and are released
+    highest priority first, then in arrival order, so registrations are not
+    starved by dashboard refreshes. A quota error from the API empties the
+    bucket for ``penalty`` seconds so every queued caller backs off together.
+    """
+
+    def __init__(self, read_per_minute=READ_PER_MINUTE, write_per_minute=WRITE_PER_MINUTE,
+                 burst=BURST, penalty=10.0):
+        self.buckets = {
+            'read': TokenBucket(read_per_minute, burst),
+            'write': TokenBucket(write_per_minute, burst),
+        }
+        self.penalty = penalty
+        self._waiting = {'read': [], 'write': []}
+        self._tickets = itertools.count()
+        self._cond = threading.Condition()
+
+    def acquire(self, kind, level=DASHBOARD, on_wait=None):
+        """Block until a call of ``kind`` at ``level`` may go out"""
+        bucket = self.buckets[kind]
+        queue = self._waiting[kind]
+        ticket = (level, next(self._tickets))
+        start = time.monotonic()
+        granted = False
+        with self._cond:
+            heapq.heappush(queue, ticket)
+        try:
+            while True:
+                with self._cond:
+                    bucket.refill()
+                    if queue[0] == ticket and bucket.tokens >= 1:
+                        heapq.heappop(queue)
+                        bucket.tokens -= 1
+                        granted = True
+                        self._cond.notify_all()
+                        break
+                    position = sum(1 for other in queue if other < ticket) + 1
+                    eta = bucket.eta(position)
+                if on_wait is not None:
+                    on_wait(position, eta)
+                with self._cond:
+                    # Woken early when the head is served, otherwise when the next token is due
+                    self._cond.wait(timeout=min(max(bucket.eta(1), 0.01), 1.0))
+        finally:
+            if not granted:
+                with self._cond:
+                    queue.remove(ticket)
+                    heapq.heapify(queue)
+                    self._cond.notify_all()
+        metrics.observe("sheets_queue_wait_seconds", time.monotonic() - start,
+                        kind=kind, priority=PRIORITY_NAMES.get(level, str(level)))
+
+    def penalize(self, kind):
+        """Back off every caller of ``kind`` after the API reported an exhausted quota"""
+        with self._cond:
+            bucket = self.buckets[kind]
+            bucket.refill()
+            bucket.tokens = min(bucket.tokens, 0) - bucket.rate * self.penalty
+
+    def queued(self):
+        """Number of callers waiting, by kind and priority name"""
+        with self._cond:
+            return {
+                kind: {PRIORITY_NAMES.get(level, str(level)): sum(1 for other, _ in queue if other == level)
+                       for level in sorted({level for level, _ in queue})}
+                for kind, queue in self._waiting.items()
+            }
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler():
+    """The process-wide scheduler shared by every worksheet handle"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = Scheduler()
+        return _scheduler
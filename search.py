@@ -0,0 +1,163 @@
+import numpy as np
+from rapidfuzz import process, fuzz
+from rapidfuzz.distance import Levenshtein
+from registry import contact_key
+
+def _grams(text, n=3):
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+def _postings(names, start=0):
+    """Trigram -> positions of the names containing it, numbering names from ``start``"""
+    postings = {}
+    for pos, name in enumerate(names, start):
+        for gram in _grams(name):
+            postings.setdefault(gram, []).append(pos)
+    return {gram: np.asarray(positions, dtype=np.int64) for gram, positions in postings.items()}
+
+class NameIndex:
+    """Pre-normalized participant names with a trigram candidate filter
+
+    Built once per data version. A search only scores names that share enough
+    trigrams with the query, in one ``cdist`` batch. Short queries, where
+    partial alignments at the ends of a name dominate, are scored against
+    every name in the same single batch. New registrations are added to
+    the postings through apply_append.
+    """
+
+    columns = ('Name',)
+
+    def __init__(self, names):
+        self.labels = names.index.to_numpy()
+        self.names = names.astype(str).str.lower().tolist()
+        self.lengths = np.array([len(name) for name in self.names], dtype=np.int64)
+        self.postings = _postings(self.names)
+
+    def apply_append(self, df, rows):
+        """Index appended ``rows``"""
+        names = rows['Name'].astype(str).str.lower().tolist()
+        for gram, positions in _postings(names, start=len(self.names)).items():
+            existing = self.postings.get(gram)
+            self.postings[gram] = positions if existing is None else np.concatenate([existing, positions])
+        self.labels = np.concatenate([self.labels, rows.index.to_numpy()])
+        self.lengths = np.concatenate([self.lengths, np.array([len(name) for name in names], dtype=np.int64)])
+        self.names += names
+        return True
+
+    def candidates(self, query):
+        grams = _grams(query)
+        if len(query) < 5:
+            return np.arange(len(self.names))
+
+        # partial_ratio aligns the shorter of query and name inside the longer,
+        # and a score of 80 leaves room for roughly one substitution per five
+        # characters of the shorter one. Each substitution breaks at most three
+        # trigrams, so the bound follows min(len(query), len(name)), not the
+        # query alone: a long query against a short name needs few shared grams.
+        shorter = np.minimum(self.lengths, len(query))
+        min_shared = np.maximum(1, np.floor(0.4 * shorter - 2))
+        counts = np.zeros(len(self.names), dtype=np.int32)
+        for gram in grams:
+            positions = self.postings.get(gram)
+            if positions is not None:
+                counts[positions] += 1
+        return np.flatnonzero(counts >= min_shared)
+
+    def search(self, term, score_cutoff=80):
+        """Matching (label, score) pairs, best match first"""
+        query = str(term).strip().lower()
+        if not query or not self.names:
+            return []
+
+        positions = self.candidates(query)
+        if not len(positions):
+            return []
+
+        choices = [self.names[pos] for pos in positions]
+        scores = process.cdist([query], choices, scorer=fuzz.partial_ratio,
+                               score_cutoff=score_cutoff, workers=-1)[0]
+        hits = np.flatnonzero(scores >= score_cutoff)
+        order = hits[np.argsort(-scores[hits], kind='stable')]
+        return [(self.labels[positions[i]], float(scores[i])) for i in order]
+
+
+def _prefix_slice(sorted_keys, prefix):
+    start = np.searchsorted(sorted_keys, prefix, side='left')
+    # Upper bound of the same length, so numpy does not widen the array to compare
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    end = np.searchsorted(sorted_keys, upper, side='left')
+    return start, end
+
+def _insert_sorted(sorted_keys, order, keys, positions):
+    """Merge ``keys`` (at ``positions``) into sorted keys and their order
+
+    New keys go after equal existing ones, as a stable sort would put them.
+    """
+    new_order = np.argsort(keys, kind='stable')
+    keys, positions = keys[new_order], positions[new_order]
+    at = np.searchsorted(sorted_keys, keys, side='right')
+    # A longer key widens the fixed-width string dtype instead of being cut
+    dtype = np.result_type(sorted_keys.dtype, keys.dtype)
+    return np.insert(sorted_keys.astype(dtype), at, keys), np.insert(order, at, positions)
+
+class ContactIndex:
+    """Sorted digit strings for exact, prefix and suffix contact lookups
+
+    Contacts are kept sorted both as typed and reversed, so a prefix or a
+    "last N digits" query is two binary searches. Only when nothing matches
+    directly are contacts within ``max_distance`` edits considered. New
+    registrations are merged into the sorted keys through apply_append.
+    """
+
+    columns = ('Contact',)
+
+    def __init__(self, contacts, min_suffix=4, max_distance=2):
+        self.min_suffix = min_suffix
+        self.max_distance = max_distance
+        self.labels = contacts.index.to_numpy()
+        self.keys = np.array([contact_key(c) for c in contacts], dtype=object)
+
+        self.order = np.argsort(self.keys.astype(str), kind='stable')
+        self.sorted_keys = self.keys[self.order].astype(str)
+
+        reversed_keys = np.array([k[::-1] for k in self.keys], dtype=str)
+        self.reverse_order = np.argsort(reversed_keys, kind='stable')
+        self.sorted_reversed = reversed_keys[self.reverse_order]
+
+    def apply_append(self, df, rows):
+        """Index appended ``rows``"""
+        keys = np.array([contact_key(c) for c in rows['Contact']], dtype=object)
+        positions = np.arange(len(self.keys), len(self.keys) + len(keys))
+        self.labels = np.concatenate([self.labels, rows.index.to_numpy()])
+        self.keys = np.concatenate([self.keys, keys])
+        self.sorted_keys, self.order = _insert_sorted(
+            self.sorted_keys, self.order, keys.astype(str), positions)
+        self.sorted_reversed, self.reverse_order = _insert_sorted(
+            self.sorted_reversed, self.reverse_order, np.array([k[::-1] for k in keys], dtype=str), positions)
+        return True
+
+    def search(self, term):
+        """Matching (label, score) pairs: exact 100, prefix 90, suffix 80"""
+        query = contact_key(term)
+        if not query or not len(self.keys):
+            return []
+
+        results = {}
+        start, end = _prefix_slice(self.sorted_keys, query)
+        for pos in self.order[start:end]:
+            results[pos] = 100.0 if self.keys[pos] == query else 90.0
+
+        if len(query) >= self.min_suffix:
+            start, end = _prefix_slice(self.sorted_reversed, query[::-1])
+            for pos in self.reverse_order[start:end]:
+                results.setdefault(pos, 80.0)
+
+        if not results:
+            # Bounded edit-distance fallback for mistyped numbers
+            distances = process.cdist([query], self.keys.tolist(), scorer=Levenshtein.distance,
+                                      score_cutoff=self.max_distance, workers=-1)[0]
+            for pos in np.flatnonzero(distances <= self.max_distance):
+                similarity = 1 - distances[pos] / max(len(query), len(self.keys[pos]))
+                results[pos] = round(float(similarity) * 100, 1)
+
+        ranked = sorted(results.items(), key=lambda item: -item[1])
+        return [(self.labels[pos], score) for pos, score in ranked]
@@ -0,0 +1,29 @@
+import os
+from config import reg_div
+
+# "single" keeps every registration in national_wk; "sharded" keeps one
+# worksheet per region, titled with the region's key in config.reg_div
+SHEETS_LAYOUT = os.getenv("SHEETS_LAYOUT", "single")
+
+NATIONAL_WORKSHEET = "national_wk"
+REGIONS = list(reg_div)
+
+# Row labels of the merged frame are the region's position times this stride
+# plus the row's label within its shard, so sheet row = label % stride + 2
+SHARD_STRIDE = 10_000_000
+
+def is_sharded():
+    return SHEETS_LAYOUT == "sharded"
+
+def worksheet_title(region=None):
+    """Worksheet a registration for ``region`` belongs in under the configured layout"""
+    if is_sharded() and region in reg_div:
+        return region
+    return NATIONAL_WORKSHEET
+
+def shard_offset(region):
+    return REGIONS.index(region) * SHARD_STRIDE
+
+def split_label(label):
+    """(region, label within the shard) of a merged-frame label"""
+    return REGIONS[int(label) // SHARD_STRIDE], int(label) % SHARD_STRIDE
@@ -0,0 +1,38 @@
+import json
+import os
+import pyarrow as pa
+
+# Arrow IPC file holding the last cleaned participant frame
+SNAPSHOT_PATH = os.getenv("DASHBOARD_SNAPSHOT", "dashboard_snapshot.arrow")
+
+_STATE_KEY = b"loader_state"
+
+def save_snapshot(path, df, state):
+    """Write ``df`` and the loader ``state`` (a JSON-able dict) as an Arrow IPC file
+
+    The file is written beside the target and renamed over it, so readers
+    never see a half-written snapshot.
+    """
+    table = pa.Table.from_pandas(df)
+    metadata = dict(table.schema.metadata or {})
+    metadata[_STATE_KEY] = json.dumps(state).encode()
+    table = table.replace_schema_metadata(metadata)
+
+    tmp = f"{path}.tmp"
+    with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp, path)
+
+def load_snapshot(path):
+    """(frame, state) from a snapshot file, memory-mapped; None if missing or unreadable"""
+    if not os.path.exists(path):
+        return None
+    try:
+        with pa.memory_map(path, "r") as source:
+            table = pa.ipc.open_file(source).read_all()
+        state = json.loads(table.schema.metadata[_STATE_KEY])
+        # Categorical columns come back from their Arrow dictionaries
+        df = table.to_pandas()
+    except (pa.ArrowException, OSError, KeyError, ValueError):
+        return None
+    return df, state
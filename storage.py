@@ -0,0 +1,383 @@
+import json
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from gspread.utils import a1_to_rowcol, column_letter_to_index, rowcol_to_a1
+from metrics import error_reason, metrics
+from scheduler import current_priority, get_scheduler
+
+# "sheets" talks to Google Sheets, "sqlite" keeps everything in a local file
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "sheets")
+SQLITE_STORAGE_PATH = os.getenv("SQLITE_STORAGE_PATH", "local_store.db")
+
+
+class QuotaExceededError(Exception):
+    """Raised by the local store when its simulated per-minute quota runs out"""
+
+    def __init__(self, kind, limit):
+        super().__init__(
+            f"APIError: [429]: RESOURCE_EXHAUSTED: Quota exceeded for {kind} requests "
+            f"per minute ({limit})"
+        )
+
+
+class WorksheetStorage:
+    """Worksheet operations used by the registration form and the dashboard
+
+    Method names and arguments follow gspread's ``Worksheet`` so callers do not
+    care which backend they hold. Ranges use A1 notation. ``write_lock`` is
+    held by writers whose read-check-write or clear-and-rewrite must not
+    interleave with other writers in this process. ``repair_lock`` is held
+    only across a clear-and-rewrite, and appends take it, so they never
+    queue behind a long conditional write.
+    """
+
+    def __init__(self):
+        self.write_lock = threading.RLock()
+        self.repair_lock = threading.RLock()
+
+    def row_values(self, row):
+        raise NotImplementedError
+
+    def get_all_values(self):
+        raise NotImplementedError
+
+    def batch_get(self, ranges):
+        raise NotImplementedError
+
+    def append_rows(self, rows):
+        raise NotImplementedError
+
+    def update(self, values, range_name='A1'):
+        raise NotImplementedError
+
+    def batch_update(self, data):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class GoogleSheetsStorage(WorksheetStorage):
+    """Storage backed by a gspread worksheet from the shared connection
+
+    With ``create`` the worksheet is added to the spreadsheet on first use
+    if it does not exist yet (e.g. a new region shard).
+    """
+
+    def __init__(self, connection, title="national_wk", create=False):
+        super().__init__()
+        self.connection = connection
+        self.title = title
+        self.create = create
+
+    @property
+    def worksheet(self):
+        # Resolved per call so token refreshes and reconnects are picked up
+        return self.connection.worksheet(self.title, create=self.create)
+
+    def row_values(self, row):
+        return self.worksheet.row_values(row)
+
+    def get_all_values(self):
+        return self.worksheet.get_all_values()
+
+    def batch_get(self, ranges):
+        return self.worksheet.batch_get(ranges)
+
+    def append_rows(self, rows):
+        return self.worksheet.append_rows(rows)
+
+    def update(self, values, range_name='A1'):
+        return self.worksheet.update(values, range_name)
+
+    def batch_update(self, data):
+        return self.worksheet.batch_update(data)
+
+    def clear(self):
+        return self.worksheet.clear()
+
+
+def parse_range(range_name):
+    """Turn an A1 range into 1-based (first row, first col, last row, last col)
+
+    Open ends such as ``1:1`` (a whole row) or ``A5:J`` (to the last row) come
+    back as None.
+    """
+    start, _, end = range_name.partition(':')
+    end = end or start
+
+    def parse(ref):
+        if ref.isdigit():
+            return int(ref), None
+        if ref.isalpha():
+            return None, column_letter_to_index(ref)
+        return a1_to_rowcol(ref)
+
+    r1, c1 = parse(start)
+    r2, c2 = parse(end)
+    return r1 or 1, c1 or 1, r2, c2
+
+
+def appended_row(response):
+    """First sheet row an ``append_rows`` call wrote, from the API response (None if not given)"""
+    try:
+        updated_range = response['updates']['updatedRange']
+    except (KeyError, TypeError):
+        return None
+    # e.g. "'national_wk'!A101:L105"
+    return parse_range(updated_range.rpartition('!')[2])[0]
+
+
+class SQLiteStorage(WorksheetStorage):
+    """Local stand-in for a worksheet with configurable latency and quota
+
+    Each sheet row is one SQLite row holding its cells as JSON. ``latency``
+    seconds (plus up to ``jitter`` more) are added to every call, and reads
+    and writes beyond ``read_quota``/``write_quota`` per minute raise
+    QuotaExceededError, mirroring the Sheets API limits. Leave the quotas at
+    None to run without limits, e.g. as the venue's offline store.
+    """
+
+    def __init__(self, path=SQLITE_STORAGE_PATH, title="national_wk", latency=0.0,
+                 jitter=0.0, read_quota=None, write_quota=None):
+        super().__init__()
+        self.path = path
+        self.title = title
+        self.latency = latency
+        self.jitter = jitter
+        self.quotas = {'read': read_quota, 'write': write_quota}
+        self._requests = {'read': deque(), 'write': deque()}
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._table = '"' + re.sub(r'\W', '_', f"sheet_{title}") + '"'
+        with self._conn:
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self._table} "
+                "(row_num INTEGER PRIMARY KEY, cells TEXT NOT NULL)"
+            )
+
+    def _request(self, kind):
+        """Apply the simulated latency and quota for one API call"""
+        if self.latency or self.jitter:
+            time.sleep(self.latency + random.uniform(0, self.jitter))
+
+        limit = self.quotas[kind]
+        if limit is None:
+            return
+        with self._lock:
+            now = time.monotonic()
+            window = self._requests[kind]
+            while window and now - window[0] >= 60:
+                window.popleft()
+            if len(window) >= limit:
+                raise QuotaExceededError(kind, limit)
+            window.append(now)
+
+    def _rows(self, first=1, last=None):
+        query = f"SELECT row_num, cells FROM {self._table} WHERE row_num >= ?"
+        params = [first]
+        if last is not None:
+            query += " AND row_num <= ?"
+            params.append(last)
+        rows = self._conn.execute(query + " ORDER BY row_num", params)
+        return {row_num: json.loads(cells) for row_num, cells in rows}
+
+    def _last_row(self):
+        return self._conn.execute(f"SELECT MAX(row_num) FROM {self._table}").fetchone()[0] or 0
+
+    def _read(self, range_name):
+        r1, c1, r2, c2 = parse_range(range_name)
+        last_row = min(r2 or self._last_row(), self._last_row())
+        rows = self._rows(r1, last_row)
+        values = []
+        for r in range(r1, last_row + 1):
+            cells = rows.get(r, [])
+            cells = cells[c1 - 1:c2] if c2 else cells[c1 - 1:]
+            while cells and cells[-1] == '':
+                cells = cells[:-1]
+            values.append(cells)
+        # Trailing empty rows are dropped, as the Sheets API does
+        while values and not values[-1]:
+            values.pop()
+        return values
+
+    def _write(self, range_name, values):
+        r1, c1, _, _ = parse_range(range_name)
+        rows = self._rows(r1, r1 + len(values) - 1)
+        for i, row_values in enumerate(values):
+            cells = rows.setdefault(r1 + i, [])
+            end = c1 - 1 + len(row_values)
+            if len(cells) < end:
+                cells.extend([''] * (end - len(cells)))
+            cells[c1 - 1:end] = ['' if v is None else str(v) for v in row_values]
+        self._conn.executemany(
+            f"INSERT OR REPLACE INTO {self._table} (row_num, cells) VALUES (?, ?)",
+            [(row_num, json.dumps(cells)) for row_num, cells in rows.items()]
+        )
+
+    def row_values(self, row):
+        self._request('read')
+        with self._lock:
+            values = self._read(f"{row}:{row}")
+        return values[0] if values else []
+
+    def get_all_values(self):
+        self._request('read')
+        with self._lock:
+            rows = self._rows()
+        if not rows:
+            return []
+        # Rows 1..last padded to the widest row, like gspread
+        width = max(len(cells) for cells in rows.values())
+        return [
+            (rows.get(r, []) + [''] * width)[:width]
+            for r in range(1, max(rows) + 1)
+        ]
+
+    def batch_get(self, ranges):
+        self._request('read')
+        with self._lock:
+            return [self._read(range_name) for range_name in ranges]
+
+    def append_rows(self, rows):
+        self._request('write')
+        with self._lock, self._conn:
+            last = self._last_row()
+            self._conn.executemany(
+                f"INSERT INTO {self._table} (row_num, cells) VALUES (?, ?)",
+                [(last + i + 1, json.dumps(['' if v is None else str(v) for v in row]))
+                 for i, row in enumerate(rows)]
+            )
+        # Shaped like the Sheets API response, which says where the rows went
+        width = max((len(row) for row in rows), default=1) or 1
+        return {'updates': {'updatedRange': f"'{self.title}'!A{last + 1}:{rowcol_to_a1(last + len(rows), width)}",
+                            'updatedRows': len(rows)}}
+
+    def update(self, values, range_name='A1'):
+        self._request('write')
+        with self._lock, self._conn:
+            self._write(range_name, values)
+
+    def batch_update(self, data):
+        self._request('write')
+        with self._lock, self._conn:
+            for item in data:
+                self._write(item['range'], item['values'])
+
+    def clear(self):
+        self._request('write')
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM {self._table}")
+
+
+class StorageWrapper(WorksheetStorage):
+    """Base for wrappers that route every call on a backend through ``_call``
+
+    Shares the backend's locks, so locking through either object excludes
+    the same writers.
+    """
+
+    READS = {'row_values', 'get_all_values', 'batch_get'}
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.write_lock = backend.write_lock
+        self.repair_lock = backend.repair_lock
+        self.title = backend.title
+
+    def _call(self, method, *args):
+        return getattr(self.backend, method)(*args)
+
+    def row_values(self, row):
+        return self._call('row_values', row)
+
+    def get_all_values(self):
+        return self._call('get_all_values')
+
+    def batch_get(self, ranges):
+        return self._call('batch_get', ranges)
+
+    def append_rows(self, rows):
+        return self._call('append_rows', rows)
+
+    def update(self, values, range_name='A1'):
+        return self._call('update', values, range_name)
+
+    def batch_update(self, data):
+        return self._call('batch_update', data)
+
+    def clear(self):
+        return self._call('clear')
+
+
+class InstrumentedStorage(StorageWrapper):
+    """Times and counts every call on the wrapped backend"""
+
+    def _call(self, method, *args):
+        kind = 'read' if method in self.READS else 'write'
+        start = time.perf_counter()
+        error = None
+        try:
+            return super()._call(method, *args)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            metrics.record_call(method, kind, time.perf_counter() - start, error)
+
+
+class ScheduledStorage(StorageWrapper):
+    """Waits for the shared scheduler before every call on the wrapped backend
+
+    The priority comes from the calling thread's ``scheduler.priority``
+    block. A quota error makes the scheduler back off all callers of that
+    kind instead of each one retrying on its own.
+    """
+
+    def __init__(self, backend, scheduler):
+        super().__init__(backend)
+        self.scheduler = scheduler
+
+    def _call(self, method, *args):
+        kind = 'read' if method in self.READS else 'write'
+        level, on_wait = current_priority()
+        self.scheduler.acquire(kind, level, on_wait)
+        try:
+            return super()._call(method, *args)
+        except Exception as e:
+            if error_reason(e) == 'quota':
+                self.scheduler.penalize(kind)
+            raise
+
+
+_storages = {}
+_storages_lock = threading.Lock()
+
+def open_worksheet(title="national_wk", create=False):
+    """Process-wide storage handle for a worksheet on the configured backend
+
+    ``create`` adds a missing Google Sheets worksheet on first use; the local
+    store always creates its tables.
+    """
+    with _storages_lock:
+        if title not in _storages:
+            if STORAGE_BACKEND == "sqlite":
+                backend = SQLiteStorage(
+                    SQLITE_STORAGE_PATH,
+                    title,
+                    latency=float(os.getenv("SQLITE_LATENCY", "0")),
+                    jitter=float(os.getenv("SQLITE_JITTER", "0")),
+                    read_quota=int(os.environ["SQLITE_READ_QUOTA"]) if os.getenv("SQLITE_READ_QUOTA") else None,
+                    write_quota=int(os.environ["SQLITE_WRITE_QUOTA"]) if os.getenv("SQLITE_WRITE_QUOTA") else None,
+                )
+            else:
+                from connect import get_connection
+                backend = GoogleSheetsStorage(get_connection(), title, create=create)
+            # Calls queue for quota first, so timings cover the API call only
+            _storages[title] = ScheduledStorage(InstrumentedStorage(backend), get_scheduler())
+        return _storages[title]
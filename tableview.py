@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+
+PAGE_SIZES = [25, 50, 100, 250]
+
+CONFIRMED_STYLE = 'background-color: #d4edda'
+UNCONFIRMED_STYLE = 'background-color: #f8d7da'
+
+def _status_display(status):
+    status = status.astype(str)
+    labels = status.mask(status.str.strip() == '', 'Unconfirmed')
+    styles = pd.Series('', index=status.index, dtype=object)
+    styles[status == 'Confirmed'] = CONFIRMED_STYLE
+    styles[status.str.strip() == ''] = UNCONFIRMED_STYLE
+    return labels.astype(object), styles
+
+class StatusStyles:
+    """Display label and cell style of every row's status, per data version
+
+    Confirmations update the affected rows in place; new registrations
+    are added at the end.
+    """
+
+    columns = ('Registration Status',)
+
+    def __init__(self, df):
+        self.labels, self.styles = _status_display(df['Registration Status'])
+
+    def apply_changes(self, df, changes, before):
+        rows = [idx for idx, cols in changes.items() if 'Registration Status' in cols]
+        if rows:
+            labels, styles = _status_display(df.loc[rows, 'Registration Status'])
+            self.labels.loc[rows] = labels
+            self.styles.loc[rows] = styles
+        return True
+
+    def apply_append(self, df, rows):
+        labels, styles = _status_display(rows['Registration Status'])
+        self.labels = pd.concat([self.labels, labels])
+        self.styles = pd.concat([self.styles, styles])
+        return True
+
+class SortOrder:
+    """Row labels of the whole frame sorted by one column, per data version
+
+    A filtered view is sorted by keeping the labels it contains, which is
+    linear instead of re-sorting.
+    """
+
+    def __init__(self, df, column):
+        self.columns = (column,)
+        keys = df[column].astype(str).str.lower().to_numpy()
+        self.labels = df.index.to_numpy()[np.argsort(keys, kind='stable')]
+
+    def for_view(self, view_index, descending=False):
+        labels = self.labels
+        if len(view_index) != len(labels):
+            labels = labels[np.isin(labels, view_index)]
+        return labels[::-1] if descending else labels
@@ -0,0 +1,31 @@
+from storage import SQLiteStorage
+
+HEADERS = [
+    "Timestamp", "Region", "Division", "Designation Level", "Name", "Gender", "Position",
+    "Contact", "Registration Status", "Confirmation Time", "Registration ID", "Row Version",
+]
+
+
+def participant(i, **values):
+    row = {
+        "Timestamp": "2026-10-01 10:00:00", "Region": "Ho", "Division": "Ho div",
+        "Designation Level": "Local", "Name": f"Person {i}", "Gender": "Male", "Position": "Member",
+        "Contact": f"02400000{i:02d}", "Registration Status": "", "Confirmation Time": "",
+        "Registration ID": f"id{i}", "Row Version": "1",
+    }
+    row.update(values)
+    return [row[header] for header in HEADERS]
+
+
+def make_sheet(n, title="test"):
+    """In-memory worksheet with the header row and ``n`` participants"""
+    worksheet = SQLiteStorage(":memory:", title)
+    worksheet.update([HEADERS])
+    worksheet.append_rows([participant(i) for i in range(n)])
+    return worksheet
+
+
+def sheet_row(worksheet, label):
+    """Row ``label`` of the sheet as {column: value}"""
+    values = worksheet.row_values(int(label) + 2)
+    return dict(zip(HEADERS, values + [''] * (len(HEADERS) - len(values))))
@@ -0,0 +1,56 @@
+import pandas as pd
+import pytest
+from bulkimport import read_upload, validate_rows
+from registry import RegistrationRegistry
+
+UPLOAD = b"""Region,Div,Designation,Full Name,Sex,Position,Phone Number
+ho,ho DIV,local,  kwame   mensah ,male,member,244000001
+Ho,Keta,Local,Abena Owusu,Female,Usher,+233 24 400 0002
+Ho,Kumasi North div,Local,Yaw Osei,Male,Member,0244000003
+Ho,Aflao,Local,Efua Tetteh,Female,Member,0244000001
+Ho,Ho div,Local,Kwame Mensah,Male,Member,0244000004
+Ho,Ho div,Chief,Kojo Badu,Male,,12345
+,,,,,,
+"""
+
+
+def validate(data=UPLOAD, registry=None):
+    return validate_rows(read_upload("list.csv", data), registry or RegistrationRegistry())
+
+
+def test_valid_rows_are_cleaned():
+    accepted, _ = validate()
+
+    assert accepted.loc[2].tolist() == ['Ho', 'Ho div', 'Local', 'Kwame Mensah', 'Male', 'Member', '0244000001']
+    assert accepted.loc[3, 'Contact'] == '0244000002'
+
+
+def test_each_rejected_row_says_why():
+    _, rejected = validate()
+
+    # Line numbers in the file; the blank last line is dropped
+    assert rejected['Reason'].to_dict() == {
+        4: "Division not in region",
+        5: "Contact repeated in file",
+        6: "Name repeated in division in file",
+        7: "Unknown designation level; Position is missing; Contact is not a 10-digit number",
+    }
+    assert rejected.loc[4, 'Name'] == 'Yaw Osei'
+
+
+def test_rows_already_registered_are_rejected():
+    registry = RegistrationRegistry()
+    registry.claim('0244000002', 'Someone', 'Keta', 'a')
+    registry.claim('0200000000', 'Kwame Mensah', 'Ho div', 'b')
+
+    accepted, rejected = validate(registry=registry)
+
+    assert rejected.loc[2, 'Reason'] == "Name already registered in division"
+    assert rejected.loc[3, 'Reason'] == "Contact already registered"
+    assert 2 not in accepted.index and 3 not in accepted.index
+
+
+def test_missing_columns_are_reported():
+    with pytest.raises(ValueError, match="Contact"):
+        validate_rows(pd.DataFrame(columns=['Region', 'Division', 'Designation Level', 'Name', 'Gender', 'Position']),
+                      RegistrationRegistry())
@@ -0,0 +1,101 @@
+import pytest
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+import storage
+from changefeed import feed
+from dash import DashboardService
+from sheets import HEADERS, participant
+
+
+def dashboard():
+    from dash import RegistrationDashboard
+    RegistrationDashboard().run()
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """Local worksheet with unconfirmed participants in two regions"""
+    # Journal, snapshot and dismissal files default to the working directory
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(storage, 'STORAGE_BACKEND', 'sqlite')
+    monkeypatch.setattr(storage, 'SQLITE_STORAGE_PATH', str(tmp_path / 'store.db'))
+    monkeypatch.setattr(storage, '_storages', {})
+    worksheet = storage.open_worksheet()
+    worksheet.update([HEADERS])
+    worksheet.append_rows([participant(i, Region='Ho' if i < 3 else 'Accra') for i in range(5)])
+    return worksheet
+
+
+@pytest.fixture
+def app(store):
+    st.cache_resource.clear()
+    yield AppTest.from_function(dashboard, default_timeout=60).run()
+    st.cache_resource.clear()
+
+
+@pytest.fixture
+def service(store):
+    service = DashboardService()
+    yield service
+    feed.unsubscribe(service.apply_change)
+
+
+def sheet_ids(worksheet):
+    return [row[HEADERS.index('Registration ID')] for row in worksheet.get_all_values()[1:]]
+
+def test_individual_confirm_clears_selection(app):
+    app.selectbox(key='individual_select').set_value('id2').run()
+    app.button(key='individual_confirm').click().run()
+
+    assert not app.exception
+    assert app.selectbox(key='individual_select').value is None
+    assert not [info for info in app.info if 'no longer' in info.value]
+
+
+def test_confirm_all_needs_a_fresh_acknowledgement(app):
+    app.selectbox(key='region_filter').set_value('Ho').run()
+    app.checkbox(key='confirm_all_ack').check().run()
+    app.button(key='confirm_all_matching').click().run()
+
+    assert not app.exception
+    # Accra is still unconfirmed, so the box is shown again, unticked
+    assert app.checkbox(key='confirm_all_ack').value is False
+
+
+def test_rewrite_keeps_rows_registered_since_load(store, service):
+    df = service.loader.load()
+    store.append_rows([participant(5)])
+
+    service.rewrite(df)
+
+    assert sheet_ids(store) == [f'id{i}' for i in range(6)]
+
+
+def test_rewrite_refuses_rows_without_id(store, service):
+    df = service.loader.load()
+    # Someone clears an ID by hand; the row can no longer be matched to ours
+    store.update([['']], 'K3')
+
+    with pytest.raises(ValueError):
+        service.rewrite(df)
+    assert sheet_ids(store) == ['id0', '', 'id2', 'id3', 'id4']
+
+
+def test_edits_the_series_cannot_follow_rebuild_it(service):
+    service.loader.load()
+    assert service.time_series().undated == 0
+
+    service.loader.patch({0: {'Timestamp': 'not a time'}})
+
+    assert service.time_series().undated == 1
+
+
+def test_renamed_participant_is_compared_again(service):
+    service.loader.load()
+    names = ['Kwame Mensah', 'Abena Owusu', 'Yaw Osei', 'Efua Tetteh', 'Kojo Badu']
+    service.loader.patch({label: {'Name': name} for label, name in enumerate(names)})
+    assert service.duplicate_clusters() == []
+
+    service.loader.patch({1: {'Name': 'Kwame Mensah'}})
+
+    assert [sorted(ids) for ids, _ in service.duplicate_clusters()] == [['id0', 'id1']]
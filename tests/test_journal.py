@@ -0,0 +1,94 @@
+import threading
+import time
+from journal import RegistrationJournal, RegistrationQueue
+from storage import SQLiteStorage
+from sheets import HEADERS, make_sheet, participant
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def make_queue(tmp_path, worksheet):
+    return RegistrationQueue(lambda title: worksheet, RegistrationJournal(str(tmp_path / "journal.db")),
+                             flush_interval=0.05, base_delay=0.01)
+
+
+def held(lock):
+    """Hold ``lock`` in another thread until the returned event is set"""
+    acquired, release = threading.Event(), threading.Event()
+
+    def hold():
+        with lock:
+            acquired.set()
+            release.wait()
+
+    threading.Thread(target=hold, daemon=True).start()
+    acquired.wait()
+    return release
+
+
+def test_registrations_do_not_wait_for_a_confirmation_write(tmp_path):
+    worksheet = make_sheet(2)
+    queue = make_queue(tmp_path, worksheet)
+    # A conditional write pausing between chunks
+    release = held(worksheet.write_lock)
+    try:
+        queue.submit(participant(2))
+        assert wait_until(lambda: queue.pending_count() == 0)
+    finally:
+        release.set()
+        queue.close()
+    assert len(worksheet.get_all_values()) == 1 + 3
+
+
+def test_registrations_wait_for_a_repair(tmp_path):
+    worksheet = make_sheet(2)
+    queue = make_queue(tmp_path, worksheet)
+    release = held(worksheet.repair_lock)
+    try:
+        queue.submit(participant(2))
+        assert not wait_until(lambda: queue.pending_count() == 0, timeout=0.3)
+        release.set()
+        assert wait_until(lambda: queue.pending_count() == 0)
+    finally:
+        release.set()
+        queue.close()
+
+
+class TimeoutAfterAppend(SQLiteStorage):
+    """Worksheet whose first append reaches the sheet but reports a timeout"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.timeouts = 1
+
+    def append_rows(self, rows):
+        response = super().append_rows(rows)
+        if self.timeouts:
+            self.timeouts -= 1
+            raise TimeoutError("The read operation timed out")
+        return response
+
+
+def test_retry_skips_rows_that_reached_the_sheet(tmp_path):
+    worksheet = TimeoutAfterAppend(":memory:", "test")
+    worksheet.update([HEADERS])
+    queue = make_queue(tmp_path, worksheet)
+    try:
+        # Journaled directly, so only the flush below sends it
+        queue.journal.append(participant(0))
+        queue.journal.append(participant(1))
+        queue.flush()
+        queue.journal.append(participant(2))
+
+        assert queue.flush() == 1
+    finally:
+        queue.close()
+    assert queue.pending_count() == 0
+    assert [row[HEADERS.index('Registration ID')] for row in worksheet.get_all_values()[1:]] == ['id0', 'id1', 'id2']
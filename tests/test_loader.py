@@ -0,0 +1,157 @@
+from aggregates import Aggregates
+from loader import IncrementalLoader, ShardedLoader
+from shards import shard_offset, split_label
+from storage import appended_row
+from timeseries import RegistrationSeries
+from writeback import write_rows
+from sheets import make_sheet, participant
+
+
+def refresh(loader):
+    """Force the next load to go to the sheet and return how it was served"""
+    loader.loaded_at = float('-inf')
+    return loader._refresh()
+
+
+def test_tail_refresh_appends_new_rows():
+    worksheet = make_sheet(5)
+    loader = IncrementalLoader(worksheet)
+    loader.load()
+    worksheet.append_rows([participant(i) for i in range(5, 8)])
+
+    assert refresh(loader) == "tail"
+    assert list(loader.df.index) == list(range(8))
+    assert loader.df.at[7, 'Registration ID'] == 'id7'
+
+
+def test_edited_probe_row_falls_back_to_full_reload():
+    worksheet = make_sheet(5)
+    loader = IncrementalLoader(worksheet)
+    loader.load()
+    # A row deleted by hand changes the last loaded row
+    worksheet.update([[''] * 12], 'A6')
+
+    assert refresh(loader) == "full"
+
+
+def test_version_bump_rereads_only_changed_rows():
+    worksheet = make_sheet(20)
+    loader = IncrementalLoader(worksheet)
+    loader.load()
+    # Another process confirms a row in the middle of the sheet
+    other = IncrementalLoader(worksheet).load()
+    write_rows(worksheet, other, {10: {'Registration Status': 'Confirmed'}},
+               {10: {'Registration Status': ''}}, pause=0)
+
+    assert refresh(loader) == "tail"
+    assert loader.df.at[10, 'Registration Status'] == 'Confirmed'
+    assert loader.df.at[10, 'Row Version'] == '2'
+    assert loader.derived('aggregates', Aggregates).confirmed == 1
+
+
+def test_many_version_bumps_fall_back_to_full_reload():
+    worksheet = make_sheet(20)
+    loader = IncrementalLoader(worksheet, reread_limit=2)
+    loader.load()
+    worksheet.update([['5'], ['5'], ['5']], 'L5:L7')
+
+    assert refresh(loader) == "full"
+    assert loader.df.loc[3:5, 'Row Version'].tolist() == ['5', '5', '5']
+
+
+def test_extend_takes_rows_only_right_below_loaded_ones():
+    worksheet = make_sheet(5)
+    loader = IncrementalLoader(worksheet)
+    loader.load()
+    aggregates = loader.derived('aggregates', Aggregates)
+
+    assert loader.extend(9, [participant(9)]) is None
+    assert loader.extend(7, [participant(5)]) is not None
+    assert len(loader.df) == 6
+    # Carried over instead of rebuilt
+    assert loader.derived('aggregates', Aggregates) is aggregates
+    assert aggregates.total == 6
+
+
+def test_patch_updates_many_rows_and_counts_in_place():
+    worksheet = make_sheet(6)
+    loader = IncrementalLoader(worksheet)
+    loader.load()
+    aggregates = loader.derived('aggregates', Aggregates)
+    changes = {i: {'Registration Status': 'Confirmed', 'Row Version': '2'} for i in range(4)}
+    # A status the frame has not seen yet, and a cell that already holds its value
+    changes[4] = {'Registration Status': 'Merged', 'Row Version': '2'}
+    changes[5] = {'Position': 'Member'}
+
+    loader.patch(changes)
+    version = loader.version
+    loader.patch(changes)
+
+    assert loader.version == version
+    assert loader.df['Registration Status'].tolist() == ['Confirmed'] * 4 + ['Merged', '']
+    assert loader.df['Row Version'].tolist() == ['2'] * 5 + ['1']
+    assert loader.derived('aggregates', Aggregates) is aggregates
+    assert (aggregates.total, aggregates.confirmed) == (5, 4)
+    assert aggregates.count('Region', 'Ho', confirmed=False) == 1
+
+
+def test_tail_refresh_carries_derived_structures_over():
+    worksheet = make_sheet(5)
+    loader = IncrementalLoader(worksheet)
+    loader.load()
+    series = loader.derived('time_series', lambda df: RegistrationSeries().update(df))
+    worksheet.append_rows([participant(5)])
+
+    assert refresh(loader) == "tail"
+    assert loader.derived('time_series', lambda df: RegistrationSeries().update(df)) is series
+    assert 'id5' in series.rows
+
+
+def test_sharded_tail_refresh_appends_to_merged_frame():
+    worksheets = {'Ho': make_sheet(3, 'Ho'), 'Wa': make_sheet(2, 'Wa')}
+    loader = ShardedLoader(worksheets)
+    loader.load()
+    aggregates = loader.derived('aggregates', Aggregates)
+    worksheets['Wa'].append_rows([participant(7)])
+
+    for shard in loader.shards.values():
+        shard.loaded_at = float('-inf')
+    loader.load()
+
+    assert loader.df.at[shard_offset('Wa') + 2, 'Registration ID'] == 'id7'
+    assert loader.derived('aggregates', Aggregates) is aggregates
+    assert aggregates.total == 6
+
+
+def sharded(**sizes):
+    worksheets = {region: make_sheet(n, region) for region, n in sizes.items()}
+    loader = ShardedLoader(worksheets)
+    loader.load()
+    return worksheets, loader
+
+
+def test_sharded_labels_carry_the_region_offset():
+    _, loader = sharded(Ho=3, Wa=2)
+    wa = shard_offset('Wa')
+
+    assert sorted(loader.df.index) == [shard_offset('Ho') + i for i in range(3)] + [wa, wa + 1]
+    assert split_label(wa + 1) == ('Wa', 1)
+    assert loader.df.at[wa + 1, 'Registration ID'] == 'id1'
+
+
+def test_sharded_patch_reaches_the_right_shard():
+    _, loader = sharded(Ho=3, Wa=2)
+
+    loader.patch({shard_offset('Wa') + 1: {'Registration Status': 'Confirmed'}})
+
+    assert loader.shards['Wa'].df.at[1, 'Registration Status'] == 'Confirmed'
+    assert loader.shards['Ho'].df.at[1, 'Registration Status'] == ''
+    assert loader.df.at[shard_offset('Wa') + 1, 'Registration Status'] == 'Confirmed'
+
+
+def test_sharded_extend_labels_rows_in_their_region():
+    worksheets, loader = sharded(Ho=3, Wa=2)
+    response = worksheets['Wa'].append_rows([participant(8)])
+
+    assert loader.extend('Wa', appended_row(response), [participant(8)]) is not None
+    assert loader.df.at[shard_offset('Wa') + 2, 'Registration ID'] == 'id8'
@@ -0,0 +1,39 @@
+from registry import RegistrationRegistry
+from sheets import HEADERS, participant
+
+
+def test_claim_refuses_known_contacts_and_names():
+    registry = RegistrationRegistry()
+    assert registry.claim('0244000001', 'Kwame Mensah', 'Ho div', 'a') is None
+
+    assert registry.claim('+233 24 400 0001', 'Someone Else', 'Ho div', 'b') == 'contact'
+    assert registry.claim('0244000002', '  kwame   MENSAH ', 'Ho Div ', 'b') == 'name'
+    # The same name in another division is someone else
+    assert registry.claim('0244000002', 'Kwame Mensah', 'Keta', 'b') is None
+
+
+def test_retried_submission_is_recognised_by_token():
+    registry = RegistrationRegistry()
+    assert registry.claim('0244000001', 'Kwame Mensah', 'Ho div', 'a', token='t1') is None
+
+    assert registry.claim('0244000001', 'Kwame Mensah', 'Ho div', 'a', token='t1') == 'token'
+
+
+def test_released_claim_can_be_made_again():
+    registry = RegistrationRegistry()
+    registry.claim('0244000001', 'Kwame Mensah', 'Ho div', 'a', token='t1')
+
+    registry.release('0244000001', 'Kwame Mensah', 'Ho div', token='t1')
+
+    assert registry.keys() == (set(), set())
+    assert registry.claim('0244000001', 'Kwame Mensah', 'Ho div', 'a', token='t1') is None
+
+
+def test_rows_are_read_under_header_variants():
+    registry = RegistrationRegistry()
+    headers = [{'Contact': 'Phone Number', 'Name': 'Full Name'}.get(header, header) for header in HEADERS]
+    registry.add_rows(headers, [participant(1), participant(2)[:5]])
+
+    contacts, names = registry.keys()
+    assert contacts == {'0240000001'}
+    assert names == {('person 1', 'ho div'), ('person 2', 'ho div')}
@@ -0,0 +1,53 @@
+import threading
+import time
+import pytest
+from scheduler import DASHBOARD, REGISTRATION, Scheduler
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_registrations_go_ahead_of_queued_reads():
+    scheduler = Scheduler(read_per_minute=300, burst=1)
+    scheduler.acquire('read')
+    order = []
+
+    def call(level, name):
+        scheduler.acquire('read', level)
+        order.append(name)
+
+    dashboard = threading.Thread(target=call, args=(DASHBOARD, 'dashboard'))
+    dashboard.start()
+    wait_until(lambda: scheduler.queued()['read'] == {'dashboard': 1})
+    registration = threading.Thread(target=call, args=(REGISTRATION, 'registration'))
+    registration.start()
+    dashboard.join()
+    registration.join()
+
+    assert order == ['registration', 'dashboard']
+
+
+class Abandon(Exception):
+    pass
+
+
+def test_penalty_backs_off_only_that_kind():
+    scheduler = Scheduler(read_per_minute=60, burst=5, penalty=10.0)
+    scheduler.penalize('read')
+    etas = []
+
+    def on_wait(position, eta):
+        etas.append(eta)
+        raise Abandon
+
+    with pytest.raises(Abandon):
+        scheduler.acquire('read', on_wait=on_wait)
+
+    assert etas[0] >= 10
+    assert scheduler.queued() == {'read': {}, 'write': {}}
+    # Writes still have their burst
+    scheduler.acquire('write', on_wait=on_wait)
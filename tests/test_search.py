@@ -0,0 +1,49 @@
+import pandas as pd
+from rapidfuzz import fuzz
+from search import ContactIndex, NameIndex
+
+
+def test_long_query_finds_short_names():
+    names = pd.Series(["Kwame Mensah", "Ama Boateng", "Kwame Mensah Boateng Asante", "Yaw Osei"])
+    query = "kwame mensah boateng jnr"
+
+    expected = {label for label, name in names.str.lower().items()
+                if fuzz.partial_ratio(query, name) >= 80}
+    assert {label for label, _ in NameIndex(names).search(query)} == expected
+    assert 0 in expected
+
+
+def test_appended_names_are_searchable():
+    index = NameIndex(pd.Series(["Kwame Mensah", "Yaw Osei"]))
+    index.apply_append(None, pd.DataFrame({'Name': ["Abena Owusu"]}, index=[2]))
+
+    assert [label for label, _ in index.search("abena owusu")] == [2]
+
+
+def contacts():
+    return ContactIndex(pd.Series(['0244000001', '0244000123', '0201110123', '0550000000']))
+
+
+def test_contact_exact_prefix_and_suffix_scores():
+    assert contacts().search('+233 24 400 0001') == [(0, 100.0)]
+    assert contacts().search('024400') == [(0, 90.0), (1, 90.0)]
+    assert contacts().search('0123') == [(1, 80.0), (2, 80.0)]
+
+
+def test_short_query_is_not_matched_as_a_suffix():
+    assert contacts().search('123') == []
+
+
+def test_mistyped_contact_falls_back_to_edit_distance():
+    results = contacts().search('0244000010')
+
+    assert [label for label, _ in results] == [0]
+    assert results[0][1] == 80.0
+
+
+def test_appended_contacts_are_searchable():
+    index = contacts()
+    index.apply_append(None, pd.DataFrame({'Contact': ['0244000999']}, index=[4]))
+
+    assert index.search('0244000999') == [(4, 100.0)]
+    assert index.search('0999') == [(4, 80.0)]
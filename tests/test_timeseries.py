@@ -0,0 +1,32 @@
+import pandas as pd
+from timeseries import QuantileSketch, RegistrationSeries
+from sheets import HEADERS, participant
+
+
+def frame(*rows):
+    return pd.DataFrame(rows, columns=HEADERS)
+
+
+def test_sketch_values_can_be_taken_out():
+    sketch = QuantileSketch()
+    sketch.add([0, 10, 100, 1000])
+    sketch.add([1000, 100], weight=-1)
+
+    assert sketch.count == 2
+    assert sketch.quantile(0) == 0.0
+    assert abs(sketch.quantile(1) - 10) / 10 < 0.02
+
+
+def test_edited_confirmation_time_moves_the_lag():
+    confirmed = {'Timestamp': '2026-10-17 09:00:00', 'Registration Status': 'Confirmed',
+                 'Confirmation Time': 'Sat 17 Oct, 09:30'}
+    df = frame(participant(0, **confirmed), participant(1))
+    series = RegistrationSeries().update(df)
+    assert abs(series.lag.quantile(0.5) - 30) < 1
+
+    df.loc[0, 'Confirmation Time'] = 'Sat 17 Oct, 11:00'
+    assert series.apply_changes(df, {0: {'Confirmation Time': 'Sat 17 Oct, 11:00'}},
+                                {0: {'Confirmation Time': 'Sat 17 Oct, 09:30'}})
+
+    assert series.lag.count == 1
+    assert abs(series.lag.quantile(0.5) - 120) < 2
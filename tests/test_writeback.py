@@ -0,0 +1,109 @@
+from loader import IncrementalLoader
+from storage import SQLiteStorage
+from writeback import write_rows
+from sheets import HEADERS, make_sheet, participant, sheet_row
+
+CONFIRM = {'Registration Status': 'Confirmed', 'Confirmation Time': 'Sat 17 Oct, 09:30'}
+UNCONFIRMED = {'Registration Status': '', 'Confirmation Time': ''}
+
+
+def load(worksheet):
+    return IncrementalLoader(worksheet).load()
+
+
+def test_write_bumps_row_version():
+    worksheet = make_sheet(5)
+    result = write_rows(worksheet, load(worksheet), {2: CONFIRM}, {2: dict(UNCONFIRMED)}, pause=0)
+
+    assert result.conflicts == [] and result.missing == []
+    assert result.applied[2]['Row Version'] == '2'
+    row = sheet_row(worksheet, 2)
+    assert row['Registration Status'] == 'Confirmed'
+    assert row['Row Version'] == '2'
+
+
+def test_stale_version_keeps_other_desks_cell():
+    worksheet = make_sheet(5)
+    ours, theirs = load(worksheet), load(worksheet)
+    # Another desk confirms first, at a different time
+    write_rows(worksheet, theirs, {1: {**CONFIRM, 'Confirmation Time': 'Sat 17 Oct, 09:00'}},
+               {1: dict(UNCONFIRMED)}, pause=0)
+
+    result = write_rows(worksheet, ours, {1: CONFIRM}, {1: dict(UNCONFIRMED)}, pause=0)
+
+    assert result.conflicts == [1]
+    row = sheet_row(worksheet, 1)
+    assert row['Confirmation Time'] == 'Sat 17 Oct, 09:00'
+    assert row['Row Version'] == '2'
+    assert result.applied[1]['Confirmation Time'] == 'Sat 17 Oct, 09:00'
+
+
+def test_merge_keeps_cells_another_desk_changed():
+    worksheet = make_sheet(5)
+    ours, theirs = load(worksheet), load(worksheet)
+    write_rows(worksheet, theirs, {3: {'Position': 'Usher'}}, {3: {'Position': 'Member'}}, pause=0)
+
+    result = write_rows(worksheet, ours, {3: CONFIRM}, {3: dict(UNCONFIRMED)}, pause=0)
+
+    assert result.conflicts == []
+    row = sheet_row(worksheet, 3)
+    assert row['Position'] == 'Usher'
+    assert row['Registration Status'] == 'Confirmed'
+    assert row['Row Version'] == '3'
+
+
+def test_reordered_sheet_finds_row_by_id():
+    worksheet = make_sheet(5)
+    df = load(worksheet)
+    # Someone sorts the sheet in reverse after we loaded it
+    worksheet.update([participant(i) for i in reversed(range(5))], 'A2')
+
+    result = write_rows(worksheet, df, {1: CONFIRM}, {1: dict(UNCONFIRMED)}, pause=0)
+
+    assert result.relocated
+    assert result.missing == []
+    assert sheet_row(worksheet, 3)['Registration ID'] == 'id1'
+    assert sheet_row(worksheet, 3)['Registration Status'] == 'Confirmed'
+    assert sheet_row(worksheet, 1)['Registration Status'] == ''
+
+
+def test_missing_row_is_reported():
+    worksheet = make_sheet(5)
+    df = load(worksheet)
+    worksheet.update([participant(9)], 'A3')
+
+    result = write_rows(worksheet, df, {1: CONFIRM}, {1: dict(UNCONFIRMED)}, pause=0)
+
+    assert result.missing == [1]
+    assert sheet_row(worksheet, 1)['Registration ID'] == 'id9'
+    assert sheet_row(worksheet, 1)['Registration Status'] == ''
+
+
+class AppendingStorage(SQLiteStorage):
+    """Worksheet where another writer appends rows while a write is reading"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.appended = None
+
+    def batch_get(self, ranges):
+        if self.appended is not None and not self.appended:
+            self.appended = [participant(i) for i in range(10, 13)]
+            self.append_rows(self.appended)
+        return super().batch_get(ranges)
+
+
+def test_rows_appended_during_write_are_kept():
+    worksheet = AppendingStorage(":memory:", "test")
+    worksheet.update([HEADERS])
+    worksheet.append_rows([participant(i) for i in range(5)])
+    df = load(worksheet)
+    worksheet.appended = []
+
+    write_rows(worksheet, df, {4: CONFIRM}, {4: dict(UNCONFIRMED)}, pause=0)
+
+    assert worksheet.appended
+    values = worksheet.get_all_values()
+    assert len(values) == 1 + 5 + 3
+    assert [row[HEADERS.index('Registration ID')] for row in values[6:]] == ['id10', 'id11', 'id12']
+    assert sheet_row(worksheet, 4)['Registration Status'] == 'Confirmed'
@@ -0,0 +1,241 @@
+import math
+import threading
+from collections import Counter
+import numpy as np
+import pandas as pd
+from aggregates import MERGED
+from rowids import ID_COLUMN
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Bucket widths kept, as pandas frequency strings
+FREQUENCIES = {'15 minutes': '15min', 'Hour': 'h'}
+
+def parse_timestamps(values):
+    """Registration timestamps as datetimes (NaT where unreadable)"""
+    return pd.to_datetime(values.astype(str), format=TIMESTAMP_FORMAT, errors='coerce')
+
+def format_minutes(minutes):
+    """A duration in minutes as '12 min', '3.5 h' or '2.1 days'"""
+    if minutes < 60:
+        return f"{minutes:.0f} min"
+    if minutes < 60 * 24:
+        return f"{minutes / 60:.1f} h"
+    return f"{minutes / (60 * 24):.1f} days"
+
+def confirmation_lags(timestamps, confirmed_at):
+    """Minutes from registration to confirmation (NaN where either is unreadable)
+
+    Confirmation times are written without a year ("Sat 17 Oct, 09:30"); they
+    take the registration's year, or the next one across New Year.
+    """
+    # Drop the weekday, which would otherwise have to agree with the guessed year
+    day_time = confirmed_at.astype(str).str.replace(r'^\S*\s*', '', regex=True)
+    years = timestamps.dt.year
+    confirmed = pd.to_datetime(years.astype('Int64').astype(str) + ' ' + day_time,
+                               format='%Y %d %b, %H:%M', errors='coerce')
+    wrapped = confirmed < timestamps - pd.Timedelta(days=1)
+    confirmed = confirmed.mask(wrapped, confirmed + pd.DateOffset(years=1))
+    # Confirmation times are to the minute, so an on-the-spot confirmation
+    # can read slightly before its registration
+    return ((confirmed - timestamps).dt.total_seconds() / 60).clip(lower=0)
+
+
+class QuantileSketch:
+    """Streaming percentiles with bounded relative error
+
+    Values are counted in bins whose bounds grow by ``gamma``, so memory
+    depends on the range of values, not their number, and every percentile
+    is within about (gamma - 1) / 2 of the exact one. Values can be removed.
+    """
+
+    def __init__(self, gamma=1.02):
+        self.gamma = gamma
+        self._log_gamma = math.log(gamma)
+        self.bins = Counter()
+        self.zeros = 0
+        self.count = 0
+
+    def add(self, values, weight=1):
+        """Count an array of non-negative values (or take them out with weight=-1)"""
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        small = values < 1e-9
+        self.zeros += weight * int(small.sum())
+        indexes, counts = np.unique(np.ceil(np.log(values[~small]) / self._log_gamma), return_counts=True)
+        for index, count in zip(indexes.astype(int).tolist(), counts.tolist()):
+            self.bins[index] += weight * count
+        self.count += weight * len(values)
+
+    def quantile(self, q):
+        """Approximate ``q`` quantile (0..1), or None when empty"""
+        if self.count <= 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if rank < seen:
+                # Midpoint of the bin (gamma^(i-1), gamma^i] in relative terms
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.bins) / (self.gamma + 1)
+
+
+def row_status(value):
+    """'Confirmed', 'Merged' (a duplicate, left out of the charts) or 'Unconfirmed'"""
+    return value if value in ('Confirmed', MERGED) else 'Unconfirmed'
+
+
+class RegistrationSeries:
+    """Registrations per time bucket by region and status, kept up to date incrementally
+
+    Counts are held per 15 minutes and per hour, keyed by (bucket, region,
+    status). Rows are tracked by registration ID: an update only parses rows
+    it has not seen, and a confirmation moves one row between statuses
+    instead of recounting; appended rows are counted through apply_append.
+    Minutes from registration to confirmation feed a QuantileSketch for
+    streaming percentiles.
+    """
+
+    # Patches to other columns leave the series as it is
+    columns = ('Timestamp', 'Region', 'Registration Status', 'Confirmation Time', ID_COLUMN)
+
+    def __init__(self):
+        self.counts = {freq: Counter() for freq in FREQUENCIES.values()}
+        # Registration ID -> [registration time, region, status], for rows with a readable Timestamp
+        self.rows = {}
+        # IDs of rows counted as confirmed or merged, to spot status changes
+        self.marked = {'Confirmed': set(), MERGED: set()}
+        # Confirmation lag of each confirmed row, so it can be taken out again
+        self.lags = {}
+        self.lag = QuantileSketch()
+        self.undated = 0
+        # Bumped on every count change; chart tables are reused until then
+        self.revision = 0
+        self._tables = {}
+        self._seen = set()
+        self._lock = threading.Lock()
+
+    def update(self, df):
+        """Count rows with new registration IDs and pick up status changes; returns self"""
+        with self._lock:
+            ids = df[ID_COLUMN].astype(str)
+            valid = (ids != '') & ~ids.duplicated()
+            self._add_unseen(df, ids, valid)
+
+            # Rows confirmed, merged or reverted elsewhere since the last update
+            changed = set()
+            for status, marked in self.marked.items():
+                now = set(ids[valid & (df['Registration Status'] == status)].tolist()).intersection(self.rows)
+                changed |= now ^ marked
+            if changed:
+                self._set_status(df[valid & ids.isin(list(changed))])
+            return self
+
+    def apply_append(self, df, rows):
+        """Count appended ``rows``"""
+        with self._lock:
+            ids = rows[ID_COLUMN].astype(str)
+            self._add_unseen(rows, ids, (ids != '') & ~ids.duplicated())
+        return True
+
+    def _add_unseen(self, df, ids, valid):
+        # Set lookups; isin would copy the whole set on every refresh
+        seen = np.fromiter((row_id in self._seen for row_id in ids.tolist()), dtype=bool, count=len(ids))
+        new = df[valid & ~seen]
+        if len(new):
+            self._add(new)
+
+    def _add(self, rows):
+        ids = rows[ID_COLUMN].astype(str)
+        self._seen.update(ids)
+        times = parse_timestamps(rows['Timestamp'])
+        dated = times.notna()
+        self.undated += int((~dated).sum())
+        rows, ids, times = rows[dated], ids[dated], times[dated]
+        status = rows['Registration Status'].astype(str).map(row_status)
+        regions = rows['Region'].astype(str)
+        self.revision += 1
+        for freq, counts in self.counts.items():
+            buckets = pd.DataFrame({'bucket': times.dt.floor(freq), 'region': regions, 'status': status})
+            counts.update(buckets.value_counts().to_dict())
+        self.rows.update((row_id, [time, region, value])
+                         for row_id, time, region, value in zip(ids, times, regions, status))
+        for value, marked in self.marked.items():
+            marked.update(ids[status == value])
+
+        confirmed = status == 'Confirmed'
+        lags = confirmation_lags(times[confirmed], rows.loc[confirmed, 'Confirmation Time'])
+        self.lags.update(zip(ids[confirmed], lags))
+        self.lag.add(lags)
+
+    def _set_status(self, rows):
+        """Move already counted rows to the status they now have"""
+        moved, relagged = [], []
+        for row_id, value, confirmed_at in zip(rows[ID_COLUMN].astype(str), rows['Registration Status'],
+                                               rows['Confirmation Time']):
+            row = self.rows.get(row_id)
+            new = row_status(value)
+            if row is None:
+                continue
+            if row[2] != new:
+                moved.append((row_id, row, row[2], new, confirmed_at))
+            elif new == 'Confirmed':
+                # Still confirmed, but the confirmation time may have been edited
+                relagged.append((row_id, row, new, new, confirmed_at))
+
+        if moved:
+            self.revision += 1
+            times = pd.Series([row[0] for _, row, _, _, _ in moved])
+            for freq, counts in self.counts.items():
+                for bucket, (_, row, old, new, _) in zip(times.dt.floor(freq), moved):
+                    counts[(bucket, row[1], old)] -= 1
+                    counts[(bucket, row[1], new)] += 1
+            for row_id, row, old, new, _ in moved:
+                row[2] = new
+                if old in self.marked:
+                    self.marked[old].discard(row_id)
+                if new in self.marked:
+                    self.marked[new].add(row_id)
+
+        # Lags of every confirmation in one parse
+        lagged = moved + relagged
+        removed = [self.lags.pop(row_id) for row_id, _, old, _, _ in lagged if old == 'Confirmed']
+        if removed:
+            self.lag.add(removed, weight=-1)
+        confirmed = [(row_id, row[0], confirmed_at) for row_id, row, _, new, confirmed_at in lagged
+                     if new == 'Confirmed']
+        if confirmed:
+            ids, times, confirmed_at = zip(*confirmed)
+            lags = confirmation_lags(pd.Series(times), pd.Series(confirmed_at))
+            self.lags.update(zip(ids, lags))
+            self.lag.add(lags)
+
+    def apply_changes(self, df, changes, before):
+        """Move rows between statuses and re-time edited confirmations; a Timestamp or Region change needs a rebuild"""
+        if any('Timestamp' in cols or 'Region' in cols for cols in changes.values()):
+            return False
+        rows = [idx for idx, cols in changes.items() if 'Registration Status' in cols or 'Confirmation Time' in cols]
+        if rows:
+            with self._lock:
+                self._set_status(df.loc[rows])
+        return True
+
+    def frame(self, freq, by):
+        """Counts per bucket of ``freq`` with one column per region or status; merged rows left out"""
+        with self._lock:
+            cached = self._tables.get((freq, by))
+            if cached is not None and cached[0] == self.revision:
+                return cached[1]
+            revision = self.revision
+            counts = pd.Series(self.counts[freq], dtype='int64')
+        if counts.empty:
+            return pd.DataFrame()
+        counts.index.names = ['bucket', 'region', 'status']
+        counts = counts[counts.index.get_level_values('status') != MERGED]
+        table = counts.groupby(level=['bucket', by.lower()]).sum().unstack(fill_value=0)
+        table = table.loc[:, table.sum() > 0]
+        self._tables[(freq, by)] = (revision, table)
+        return table
@@ -1,61 +1,108 @@
 import streamlit as st
-import pandas as pd
-from config import reg_div
+from config import reg_div, genders, designation_levels
 from datetime import datetime
-from connect import cred
-import gspread
+from storage import open_worksheet
+from journal import RegistrationQueue
+from registry import RegistrationRegistry
+from metrics import metrics
+from headers import canonical_headers
+from rowids import new_registration_id
+from scheduler import REGISTRATION, priority
+from quotanotice import sheets_priority
+from shards import NATIONAL_WORKSHEET, is_sharded, worksheet_title
 import time
+import uuid
+
+REQUIRED_HEADERS = [
+    "Timestamp", "Region", "Division", "Designation Level", 
+    "Name", "Gender", "Position", "Contact", 
+    "Registration Status", "Confirmation Time", "Registration ID", "Row Version"
+]
+
+@st.cache_resource
+def get_registration_queue():
+    # One write-behind queue per process, shared by every registration session.
+    # Region shards are created on first use.
+    return RegistrationQueue(lambda title: open_worksheet(title, create=is_sharded()))
+
+@st.cache_resource
+def get_registration_registry():
+    # Built once per process from the rows still waiting in the journal and
+    # every registration worksheet; accepted submissions keep it current
+    registry = RegistrationRegistry()
+    waiting = {}
+    for _, values, title, _ in get_registration_queue().journal.pending():
+        waiting.setdefault(title or NATIONAL_WORKSHEET, []).append(values)
+    titles = {worksheet_title(region) for region in reg_div} | set(waiting)
+    with priority(REGISTRATION):
+        for title in sorted(titles):
+            values = open_worksheet(title, create=is_sharded()).get_all_values()
+            if values:
+                registry.add_rows(values[0], values[1:] + waiting.get(title, []))
+    return registry
+
+def check_headers(worksheet):
+    """Add any missing or duplicate-fixed headers to ``worksheet``; returns its headers"""
+    # Get current headers; the form's calls go ahead of dashboard reads
+    with sheets_priority(REGISTRATION):
+        current_headers = worksheet.row_values(1)
+    
+    # Handle duplicate headers
+    header_counts = {}
+    clean_headers = []
+    for header in current_headers:
+        if header in header_counts:
+            header_counts[header] += 1
+            clean_header = f"{header}_{header_counts[header]}"
+        else:
+            header_counts[header] = 0
+            clean_header = header
+        clean_headers.append(clean_header)
+    
+    # Add missing columns if needed
+    missing_headers = [h for h in REQUIRED_HEADERS if h not in canonical_headers(clean_headers)]
+    
+    if missing_headers or any(k > 0 for k in header_counts.values()):
+        # Add missing headers to the worksheet
+        clean_headers = clean_headers + missing_headers
+        with sheets_priority(REGISTRATION):
+            worksheet.update([clean_headers], 'A1')
+    return clean_headers
 
 def workers():
-    client = cred()
-    spreadsheet = client.open("mini_congress")
-    worksheet = spreadsheet.worksheet("national_wk")
+    queue = get_registration_queue()
     st.write("✅ Network Active!")
+    
+    pending = queue.pending_count()
+    if pending:
+        st.caption(f"⏳ {pending} registration(s) waiting to sync")
 
-    # Pre-check headers once at start
-    if 'headers_checked' not in st.session_state:
+    # Pre-check headers once at start; region shards are checked when first used
+    if not is_sharded() and 'headers_checked' not in st.session_state:
         try:
-            # Get current headers
-            current_headers = worksheet.row_values(1)
-            required_headers = [
-                "Timestamp", "Region", "Division", "Designation Level", 
-                "Name", "Gender", "Position", "Contact", 
-                "Registration Status", "Confirmation Time"
-            ]
-            
-            # Handle duplicate headers
-            header_counts = {}
-            clean_headers = []
-            for header in current_headers:
-                if header in header_counts:
-                    header_counts[header] += 1
-                    clean_header = f"{header}_{header_counts[header]}"
-                else:
-                    header_counts[header] = 0
-                    clean_header = header
-                clean_headers.append(clean_header)
-            
-            # Add missing columns if needed
-            missing_headers = [h for h in required_headers if h not in clean_headers]
-            
-            if missing_headers or any(k > 0 for k in header_counts.values()):
-                # Add missing headers to the worksheet
-                new_headers = clean_headers + missing_headers
-                worksheet.update('A1', [new_headers])
-            
+            st.session_state.clean_headers = check_headers(open_worksheet(NATIONAL_WORKSHEET))
             st.session_state.headers_checked = True
-            st.session_state.clean_headers = new_headers if 'new_headers' in locals() else clean_headers
         except Exception as e:
             st.error(f"Header check failed: {str(e)}")
             return
 
+    try:
+        with st.spinner("Loading existing registrations..."):
+            registry = get_registration_registry()
+    except Exception as e:
+        st.error(f"Loading existing registrations failed: {str(e)}")
+        return
+
+    # A retried or double-tapped submission reuses the token and is not added again
+    token = st.session_state.setdefault('submission_token', uuid.uuid4().hex)
+
     with st.container(border=True):
         name = st.text_input("Full Name", placeholder="Full Name", key="name").strip()
         
-        gender_options = ["Select", "Male", "Female"]
+        gender_options = ["Select"] + genders
         gender = st.selectbox("Gender", gender_options, index=0, key="gender")
 
-        designation_options = ["Select", "National", "Regional", "Divisional", "Group", "District", "Local"]
+        designation_options = ["Select"] + designation_levels
         designation = st.selectbox("Designation Level", designation_options, index=0, key="designation")
 
         position = st.text_input("Position", placeholder="Your Role", key="position").strip()
@@ -108,6 +155,7 @@ def workers():
                 st.stop()
 
             # Prepare data for saving
+            registration_id = new_registration_id()
             wk_regis = [
                 datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
                 selected_region.strip(),
@@ -118,52 +166,65 @@ def workers():
                 position.title(),
                 contact,
                 "Confirmed",
-                datetime.now().strftime("%a %d %b, %H:%M")
+                datetime.now().strftime("%a %d %b, %H:%M"),
+                registration_id,
+                1
             ]
 
             try:
-                # Append the new registration with retry logic
-                success = False
-                attempts = 0
-                max_attempts = 3
+                # Get the target worksheet's headers to determine column order
+                title = worksheet_title(selected_region)
+                if title == NATIONAL_WORKSHEET:
+                    current_headers = st.session_state.clean_headers
+                else:
+                    shard_headers = st.session_state.setdefault('shard_headers', {})
+                    if title not in shard_headers:
+                        shard_headers[title] = check_headers(open_worksheet(title, create=True))
+                    current_headers = shard_headers[title]
                 
-                while not success and attempts < max_attempts:
-                    try:
-                        # Get current headers to determine column order
-                        current_headers = st.session_state.clean_headers
-                        
-                        # Create a dictionary for the new row
-                        row_data = {}
-                        for i, header in enumerate(current_headers):
-                            if i < len(wk_regis):
-                                row_data[header] = wk_regis[i]
-                            else:
-                                row_data[header] = ""  # Fill missing columns
-                        
-                        # Convert to list in header order
-                        row_values = [row_data.get(header, "") for header in current_headers]
-                        
-                        # Append the new registration
-                        worksheet.append_row(row_values)
-                        success = True
-                    except gspread.exceptions.APIError as e:
-                        if "RESOURCE_EXHAUSTED" in str(e):
-                            attempts += 1
-                            st.warning(f"API busy, retrying ({attempts}/{max_attempts})...")
-                            time.sleep(2)  # Wait before retrying
-                        else:
-                            raise
+                # Create a dictionary for the new row
+                row_data = dict(zip(REQUIRED_HEADERS, wk_regis))
                 
-                if success:
-                    st.success("✅ Successfully Submitted!")
-                    st.balloons()
-                    time.sleep(1.5)
-                    st.rerun()
+                # Convert to list in header order, matching header variants
+                # such as "Reg Status"; missing columns are left blank
+                row_values = [row_data.get(header, "") for header in canonical_headers(current_headers)]
+            except Exception as e:
+                st.error(f"Data not submitted: {str(e)}")
+                st.stop()
+
+            # Refuse people who are already registered, without reading the sheet.
+            # Claimed only now, so nothing that can interrupt the script runs
+            # between the claim and the journal write.
+            duplicate = registry.claim(contact, name, selected_division, registration_id, token)
+            if duplicate:
+                metrics.inc("registration_duplicates_total", reason=duplicate)
+                if duplicate == 'token':
+                    st.info("This registration was already submitted.")
+                elif duplicate == 'contact':
+                    st.error(f"{contact} is already registered")
                 else:
-                    st.error("Failed to submit after multiple attempts. Please try again later.")
-                
+                    st.error(f"{name.title()} is already registered in {selected_division}")
+                st.stop()
+
+            journaled = False
+            try:
+                # Journal locally; the background queue appends it to the sheet
+                queue.submit(row_values, title)
+                journaled = True
             except Exception as e:
                 st.error(f"Data not submitted: {str(e)}")
+            finally:
+                # Also on Streamlit's rerun and stop, which are not Exceptions
+                if not journaled:
+                    registry.release(contact, name, selected_division, token)
+            if not journaled:
+                return
+
+            del st.session_state['submission_token']
+            st.success("✅ Successfully Submitted!")
+            st.balloons()
+            time.sleep(1.5)
+            st.rerun()
 
 if __name__ == "__main__":
     workers()
\ No newline at end of file
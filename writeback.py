@@ -0,0 +1,185 @@
+import re
+import time
+from gspread.utils import rowcol_to_a1
+import pandas as pd
+from changefeed import RowsChanged, feed
+from cleaning import canonical_headers, clean_rows
+from rowids import ID_COLUMN
+
+VERSION_COLUMN = 'Row Version'
+
+def _runs(numbers):
+    """Split sorted integers into runs of consecutive values"""
+    run = []
+    for number in numbers:
+        if run and number != run[-1] + 1:
+            yield run
+            run = []
+        run.append(number)
+    if run:
+        yield run
+
+def _column_letter(col):
+    return re.sub(r'\d', '', rowcol_to_a1(1, col))
+
+def parse_version(value):
+    """Row Version cell as an int; blank or unreadable counts as 0"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+def cell_ranges(headers, row_changes):
+    """Range updates for {sheet row: {column: value}}
+
+    Adjacent changed columns in a row (e.g. Registration Status and
+    Confirmation Time) share one range, and consecutive rows that change the
+    same columns are merged into one rectangular block.
+    """
+    by_columns = {}
+    for sheet_row, changes in row_changes.items():
+        cols = {headers.index(col) + 1: value for col, value in changes.items()}
+        by_columns.setdefault(tuple(sorted(cols)), {})[sheet_row] = cols
+
+    ranges = []
+    for columns, rows in by_columns.items():
+        for col_run in _runs(columns):
+            for row_run in _runs(sorted(rows)):
+                start = rowcol_to_a1(row_run[0], col_run[0])
+                end = rowcol_to_a1(row_run[-1], col_run[-1])
+                ranges.append({
+                    'range': start if start == end else f"{start}:{end}",
+                    'values': [[str(rows[r][c]) for c in col_run] for r in row_run]
+                })
+    return ranges
+
+def batch_update_chunked(worksheet, ranges, chunk_size=500, pause=1.0):
+    """Send range updates in batches of ``chunk_size``, pausing between batches
+    so a large write does not use up the per-minute write quota at once"""
+    for i in range(0, len(ranges), chunk_size):
+        if i:
+            time.sleep(pause)
+        worksheet.batch_update(ranges[i:i + chunk_size])
+
+def read_rows(worksheet, raw_headers, sheet_rows, chunk_size=100):
+    """Current cleaned values of the given sheet rows, indexed by row label"""
+    runs = list(_runs(sorted(set(sheet_rows))))
+    if not runs:
+        return None
+    labels, rows = [], []
+    for i in range(0, len(runs), chunk_size):
+        chunk = runs[i:i + chunk_size]
+        results = worksheet.batch_get([f"{run[0]}:{run[-1]}" for run in chunk])
+        for run, values in zip(chunk, results):
+            labels += [row - 2 for row in run]
+            rows += list(values) + [[]] * (len(run) - len(values))
+    # Clean everything in one pass; scattered rows would otherwise mean one
+    # small frame per run
+    df = clean_rows(raw_headers, rows)
+    df.index = pd.Index(labels)
+    return df
+
+class WriteResult:
+    """Outcome of a conditional write
+
+    ``applied`` maps row label to the values now in the sheet for the
+    written columns, ready to patch into the cached frame. ``conflicts``
+    lists labels where another writer got there first and their values
+    were kept; ``missing`` lists labels whose row could not be found.
+    """
+
+    def __init__(self):
+        self.applied = {}
+        self.conflicts = []
+        self.missing = []
+        self.relocated = False
+
+def write_rows(worksheet, df, changes, base, chunk_size=500, pause=1.0):
+    """Write changed cells only if each row still has the version that was read
+
+    ``df`` is the frame the changes were made against, ``changes`` maps row
+    label to {column: new value} and ``base`` to the values read before the
+    change (including the Row Version read, if it was captured then).
+    Every written row gets its Row Version bumped. A row whose version
+    moved on is re-read and merged field by field: cells nobody else
+    touched take our value, cells another desk changed keep theirs. Rows are
+    found again by registration ID if the sheet was reordered.
+
+    The read-check-write runs under the storage's write lock, so desks in
+    this process cannot interleave, and only the target rows are touched,
+    so rows appended in the meantime are never overwritten. Large writes
+    are sent in chunks of ``chunk_size`` ranges, ``pause`` seconds apart.
+    """
+    result = WriteResult()
+    if not changes:
+        return result
+
+    with worksheet.write_lock:
+        raw_headers = worksheet.row_values(1)
+        headers = canonical_headers(raw_headers)
+        ranges = []
+
+        # Columns missing from the sheet get a header cell appended on the right
+        needed = {col for cols in changes.values() for col in cols} | {VERSION_COLUMN}
+        for col in sorted(needed - set(headers)):
+            headers.append(col)
+            raw_headers.append(col)
+            ranges.append({'range': rowcol_to_a1(1, len(headers)), 'values': [[col]]})
+
+        current = read_rows(worksheet, raw_headers, [int(label) + 2 for label in changes])
+        compare = sorted({col for cols in changes.values() for col in cols} | {ID_COLUMN, VERSION_COLUMN})
+        current_rows = current[compare].to_dict('index')
+        expected_ids = df[ID_COLUMN].reindex(list(changes)).to_dict()
+        targets = {}
+        lost = []
+        for label in changes:
+            expected_id = expected_ids[label]
+            if expected_id and current_rows[label][ID_COLUMN] != expected_id:
+                lost.append(label)
+            else:
+                targets[label] = (label, current_rows[label])
+
+        if lost:
+            # The sheet was reordered: find the rows again by registration ID
+            id_col = _column_letter(headers.index(ID_COLUMN) + 1)
+            id_values = worksheet.batch_get([f"{id_col}2:{id_col}"])[0]
+            positions = {row[0]: pos for pos, row in enumerate(id_values) if row}
+            found = {label: positions[expected_ids[label]] for label in lost
+                     if expected_ids[label] in positions}
+            result.missing = [label for label in lost if label not in found]
+            if found:
+                moved = read_rows(worksheet, raw_headers, [pos + 2 for pos in found.values()])
+                moved_rows = moved[compare].to_dict('index')
+                for label, pos in found.items():
+                    targets[label] = (pos, moved_rows[pos])
+                result.relocated = True
+
+        row_changes = {}
+        for label, (row_label, row) in targets.items():
+            read_version = parse_version(base[label].get(VERSION_COLUMN, df.at[label, VERSION_COLUMN]))
+            current_version = parse_version(row[VERSION_COLUMN])
+            write, kept = {}, {}
+            for col, value in changes[label].items():
+                theirs = row[col]
+                if current_version == read_version or str(theirs) == str(base[label][col]):
+                    write[col] = value
+                elif str(theirs) != str(value):
+                    # Another desk changed this cell since we read it; theirs stands
+                    kept[col] = theirs
+
+            if kept:
+                result.conflicts.append(label)
+            if write:
+                current_version += 1
+                write[VERSION_COLUMN] = current_version
+                row_changes[int(row_label) + 2] = write
+            result.applied[row_label] = {**kept, **write, VERSION_COLUMN: str(current_version)}
+
+        ranges += cell_ranges(headers, row_changes)
+        batch_update_chunked(worksheet, ranges, chunk_size, pause)
+
+    if result.applied:
+        # Other dashboards in this process see the change without reading the sheet
+        feed.publish(RowsChanged(worksheet.title, {int(label) + 2: dict(values)
+                                                   for label, values in result.applied.items()}))
+    return result